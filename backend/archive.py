@@ -0,0 +1,149 @@
+"""Archival tier for payments and abandoned gateway transactions.
+
+Pending Stripe/Razorpay transactions get an ``expires_at`` date when they are
+created; a TTL index removes the ones never completed, and completing a
+transaction unsets the field so it is kept.
+
+Payments of closed financial years are moved to ``payments_archive`` (created
+with zstd block compression) in batches. Each batch is copied and then deleted
+from ``payments``, and a copy that already exists in the archive is ignored, so
+an interrupted run simply picks up where it stopped. The ``archive_state``
+document records the first period still held in ``payments``; reads that reach
+back before it are fanned out to the archive and merged.
+"""
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+Period = Tuple[int, int]
+
+
+def archive_cutoff(now: datetime, fy_start_month: int, keep_years: int) -> Period:
+    """First (year, month) kept hot: the start of the financial year ``keep_years`` before the current one."""
+    fy_start_year = now.year if now.month >= fy_start_month else now.year - 1
+    return fy_start_year - keep_years, fy_start_month
+
+
+async def backfill_transaction_expiry(db, ttl: timedelta):
+    """Give pending transactions created before expiry existed a fresh ``expires_at``."""
+    result = await db.payment_transactions.update_many(
+        {"payment_status": "pending", "expires_at": {"$exists": False}},
+        {"$set": {"expires_at": datetime.now(timezone.utc) + ttl}}
+    )
+    if result.modified_count:
+        logger.info("Set expiry on %d pending payment transactions", result.modified_count)
+
+
+def before_period(period: Period) -> dict:
+    year, month = period
+    return {"$or": [{"year": {"$lt": year}}, {"year": year, "month": {"$lt": month}}]}
+
+
+class PaymentArchive:
+    def __init__(self, db, state_ttl: float = 60.0):
+        self.db = db
+        self.hot = db.payments
+        self.cold = db.payments_archive
+        self.state_ttl = state_ttl
+        self._boundary: Optional[Period] = None
+        self._boundary_checked = 0.0
+
+    async def ensure_collection(self):
+        try:
+            await self.db.create_collection(
+                "payments_archive",
+                storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}}
+            )
+        except CollectionInvalid:
+            pass
+        await self.cold.create_index([("society_id", 1), ("id", 1)], unique=True)
+        await self.cold.create_index([("society_id", 1), ("flat_id", 1), ("year", 1), ("month", 1)])
+        await self.cold.create_index([("society_id", 1), ("created_at", -1)])
+
+    async def boundary(self, fresh: bool = False) -> Optional[Period]:
+        """First period still in the hot collection, or None if nothing was archived.
+
+        A boundary is cached for ``state_ttl`` seconds; ``None`` is not, since
+        another worker may start archiving at any moment. ``fresh`` skips the cache.
+        """
+        if fresh or self._boundary is None or time.monotonic() - self._boundary_checked > self.state_ttl:
+            state = await self.db.archive_state.find_one({"_id": "payments"})
+            self._boundary = tuple(state['archived_before']) if state else None
+            self._boundary_checked = time.monotonic()
+        return self._boundary
+
+    async def archive_before(self, cutoff: Period, batch_size: int = 1000, on_batch=None) -> int:
+        """Move every payment dated before ``cutoff`` to the archive; return how many moved."""
+        await self.db.archive_state.update_one(
+            {"_id": "payments"}, {"$max": {"archived_before": list(cutoff)}}, upsert=True
+        )
+        self._boundary_checked = 0.0
+        moved = 0
+        # One society at a time, so every batch is served by a tenant-prefixed index.
+        for society in await self.db.societies.find({}, {"_id": 0, "id": 1}).to_list(None):
+            query = {"society_id": society['id'], **before_period(cutoff)}
+            while True:
+                batch = await self.hot.find(query, {"_id": 0}).limit(batch_size).to_list(batch_size)
+                if not batch:
+                    break
+                try:
+                    await self.cold.insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Copies left by an interrupted run are fine; anything else is not.
+                    if any(err['code'] != 11000 for err in e.details['writeErrors']):
+                        raise
+                await self.hot.delete_many({"society_id": society['id'], "id": {"$in": [p['id'] for p in batch]}})
+                moved += len(batch)
+                if on_batch:
+                    await on_batch()
+        return moved
+
+    async def reaches_archive(self, from_period: Optional[Period], fresh: bool = False) -> bool:
+        boundary = await self.boundary(fresh)
+        return boundary is not None and (from_period is None or from_period < boundary)
+
+    async def find(self, query: dict, projection: dict, from_period: Optional[Period],
+                   offset: int, limit: int) -> List[dict]:
+        """Newest-first payments matching ``query``, read from the archive too when needed."""
+        if not await self.reaches_archive(from_period):
+            return await self.hot.find(query, projection).sort("created_at", -1).skip(offset).limit(limit).to_list(limit)
+
+        # Each side can contribute at most offset + limit rows; merging needs created_at.
+        strip_created = any(v == 1 for v in projection.values()) and "created_at" not in projection
+        fetch_projection = {**projection, "created_at": 1} if strip_created else projection
+        hot, cold = [
+            await collection.find(query, fetch_projection).sort("created_at", -1).limit(offset + limit).to_list(offset + limit)
+            for collection in (self.hot, self.cold)
+        ]
+        merged = list(heapq.merge(hot, cold, key=lambda p: p['created_at'], reverse=True))[offset:offset + limit]
+        if strip_created:
+            for payment in merged:
+                payment.pop('created_at', None)
+        return merged
+
+    async def find_all(self, query: dict, projection: dict, from_period: Optional[Period]) -> List[dict]:
+        """Every payment matching ``query``, unordered, read from the archive too when needed.
+
+        Used for the paid checks that stop a due being charged twice, so the
+        boundary is re-read rather than taken from the cache.
+        """
+        collections = [self.hot, self.cold] if await self.reaches_archive(from_period, fresh=True) else [self.hot]
+        return [payment for collection in collections
+                for payment in await collection.find(query, projection).to_list(None)]
+
+    async def total_paid(self, analytics_db, match: dict, max_time_ms: int) -> float:
+        total = 0
+        names = ["payments", "payments_archive"] if await self.boundary() else ["payments"]
+        for name in names:
+            rows = await analytics_db[name].aggregate([
+                {"$match": match},
+                {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+            ], maxTimeMS=max_time_ms).to_list(1)
+            total += rows[0]['total'] if rows else 0
+        return total
@@ -0,0 +1,139 @@
+"""Write-behind audit log.
+
+Handlers call ``record()``, which only appends the event to an in-memory queue.
+A background task writes the queue to the ``audit_log`` collection with
+``insert_many`` once ``batch_size`` events are waiting or ``flush_interval``
+seconds have passed, whichever comes first. ``stop()`` queues a stop marker
+behind the pending events, so the writer drains and flushes everything before it
+exits.
+
+The queue is bounded. When it is full, ``record()`` waits up to
+``backpressure_timeout`` seconds for room and then drops the event and counts it,
+so a slow or unavailable database can never stall request handling for long.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop(); the writer flushes what it holds and exits when it reaches it.
+_STOP = object()
+
+
+class AuditLog:
+    def __init__(self, collection, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_queue: int = 10000, backpressure_timeout: float = 0.05):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure_timeout = backpressure_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._task is None:
+            try:
+                await self.collection.create_index([("target_id", 1), ("created_at", -1)])
+            except Exception as e:
+                logger.warning("Could not create audit_log index: %s", e)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            # Not task.cancel(): a cancellation arriving inside wait_for can be lost
+            # on some Python 3.11 releases, leaving shutdown waiting forever.
+            if not self._task.done():
+                await self._queue.put(_STOP)
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def record(self, actor: dict, action: str, target_type: str, target_id: str,
+                     details: Optional[dict] = None):
+        event = {
+            "id": new_id(),
+            "society_id": actor.get('society_id'),
+            "actor_id": actor.get('user_id'),
+            "actor_email": actor.get('email'),
+            "action": action,
+            "target_type": target_type,
+            "target_id": target_id,
+            "details": details or {},
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.backpressure_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                logger.warning("Audit queue full, dropped %s event for %s", action, target_id)
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "written": self.written,
+                "dropped": self.dropped, "failed": self.failed}
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        stopping = False
+        try:
+            while not stopping:
+                event = await self._queue.get()
+                if event is _STOP:
+                    break
+                batch.append(event)
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        async with asyncio.timeout(timeout):
+                            event = await self._queue.get()
+                    except TimeoutError:
+                        break
+                    if event is _STOP:
+                        stopping = True
+                        break
+                    batch.append(event)
+                await self._write(batch)
+                batch = []
+            # Events recorded while stopping are written too.
+            await self._write_all(self._drain())
+        except asyncio.CancelledError:
+            # Cancelled outright: write whatever is in hand and whatever is still queued.
+            await self._write_all(batch + self._drain())
+            raise
+
+    def _drain(self) -> list:
+        events = []
+        while not self._queue.empty():
+            event = self._queue.get_nowait()
+            if event is not _STOP:
+                events.append(event)
+        return events
+
+    async def _write_all(self, events: list):
+        for start in range(0, len(events), self.batch_size):
+            await self._write(events[start:start + self.batch_size])
+
+    async def _write(self, batch: list):
+        if not batch:
+            return
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error("Failed to write %d audit events: %s", len(batch), e)
@@ -0,0 +1,236 @@
+"""Streaming backup and restore of one society's data.
+
+A backup is gzip-compressed NDJSON in MongoDB Extended JSON (so dates survive
+the round trip). The first line is a header; every other line is one document:
+
+    {"format": "apartment-backup", "version": 1, "society_id": "...", "snapshot": true, ...}
+    {"collection": "flats", "doc": {...}}
+
+All collections are read in one snapshot session when the deployment supports
+it (replica sets and sharded clusters), so the archive is consistent even while
+payments keep arriving; on a standalone server the collections are read one after
+another. Users are written without ``password_hash``.
+
+Restore reads the upload as a stream, decompresses and parses it line by line and
+applies it with batched ``bulk_write`` upserts keyed on ``(society_id, id)``, so
+memory use does not depend on the archive size. Documents are replaced with
+their backed-up version. Users are updated field by field so their current
+password hash is kept; a user deleted since the backup has no password to come
+back with, so it is not recreated but reported in ``skipped_users``. Documents
+created after the backup are left alone; one that holds a unique key the
+archive also uses (a flat number reused under a new id, say) keeps it, and the
+archived document is reported in ``conflicts`` while the rest is still restored.
+The writes are idempotent, so a restore that fails part way can simply be re-run.
+
+With ``replace`` the society is made to match the archive: every restored
+document is stamped with the run's id, and once the whole archive has been
+applied the society's documents without that stamp (created after the backup)
+are deleted. Documents that conflicted are kept aside, which only costs memory
+for the conflicts, and written again once the documents holding their keys are
+gone; the stamps are then removed. Users are never deleted, as the archive
+cannot bring back the ones that would be lost.
+"""
+import json
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List
+
+from bson import json_util
+from fastapi import HTTPException
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "apartment-backup"
+VERSION = 1
+COLLECTIONS = {
+    "users": {"_id": 0, "password_hash": 0},
+    "flats": {"_id": 0},
+    "monthly_charges": {"_id": 0},
+    "payments": {"_id": 0},
+    "payments_archive": {"_id": 0},
+    "payment_transactions": {"_id": 0},
+    "dues": {"_id": 0},
+}
+MAX_LINE_BYTES = 1024 * 1024
+# Stamped on documents written by a replacing restore, until it has finished.
+RESTORE_MARK = "_restore_run"
+
+
+def _line(value: dict) -> bytes:
+    return json_util.dumps(value, json_options=json_util.RELAXED_JSON_OPTIONS).encode('utf-8') + b"\n"
+
+
+async def supports_snapshot(client) -> bool:
+    """Snapshot reads need a replica set or a sharded cluster."""
+    try:
+        hello = await client.admin.command("hello")
+    except Exception as e:
+        logger.warning("Could not determine server topology, backing up without a snapshot: %s", e)
+        return False
+    return bool(hello.get('setName')) or hello.get('msg') == "isdbgrid"
+
+
+async def backup_stream(client, db, society_id: str, snapshot: bool,
+                        batch_size: int = 1000, flush_every: int = 500) -> AsyncIterator[bytes]:
+    """Yield the gzip-compressed archive of the society in chunks."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    session = await client.start_session(snapshot=True) if snapshot else None
+    try:
+        yield compressor.compress(_line({
+            "format": FORMAT, "version": VERSION, "society_id": society_id, "snapshot": snapshot,
+            "created_at": datetime.now(timezone.utc).isoformat(), "collections": list(COLLECTIONS)
+        }))
+        for name, projection in COLLECTIONS.items():
+            cursor = db[name].find({"society_id": society_id}, projection, session=session, batch_size=batch_size)
+            pending = 0
+            async for doc in cursor:
+                chunk = compressor.compress(_line({"collection": name, "doc": doc}))
+                pending += 1
+                if pending >= flush_every:
+                    chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+                    pending = 0
+                if chunk:
+                    yield chunk
+        yield compressor.flush()
+    finally:
+        if session is not None:
+            await session.end_session()
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # 47 accepts both gzip and zlib framing.
+    decompressor = zlib.decompressobj(47)
+    buffer = b""
+    async for chunk in chunks:
+        # Bounded output per step, so a small upload cannot inflate into memory at once.
+        data = decompressor.decompress(chunk, MAX_LINE_BYTES)
+        while True:
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            if len(buffer) > MAX_LINE_BYTES:
+                raise HTTPException(status_code=400, detail="Backup line too long")
+            for line in lines:
+                if line:
+                    yield line
+            if not decompressor.unconsumed_tail:
+                break
+            data = decompressor.decompress(decompressor.unconsumed_tail, MAX_LINE_BYTES)
+    buffer += decompressor.flush()
+    for line in buffer.split(b"\n"):
+        if line:
+            yield line
+
+
+async def restore_stream(db, society_id: str, chunks: AsyncIterator[bytes], batch_size: int = 1000,
+                         replace: bool = False) -> dict:
+    """Apply an archive produced by ``backup_stream``.
+
+    Returns ``{"restored": {collection: count}, "skipped_users": [user ids],
+    "conflicts": {collection: [ids not restored because of a unique key]},
+    "deleted": {collection: count}}``; ``deleted`` is only filled with ``replace``.
+    """
+    run = new_id()
+    counts = {name: 0 for name in COLLECTIONS}
+    deleted = {name: 0 for name in COLLECTIONS}
+    skipped_users: List[str] = []
+    conflicts: Dict[str, List[str]] = {}
+    # Replace mode: conflicting documents to write again once the stale ones are deleted.
+    deferred: Dict[str, List[dict]] = {}
+    batches: Dict[str, List[dict]] = {name: [] for name in COLLECTIONS}
+
+    async def write(name: str, docs: List[dict]) -> List[dict]:
+        """Write ``docs``; return the ones refused because another document holds a unique key."""
+        if name == "users":
+            existing = set(await db.users.distinct(
+                "id", {"society_id": society_id, "id": {"$in": [doc['id'] for doc in docs]}}
+            ))
+            skipped_users.extend(doc['id'] for doc in docs if doc['id'] not in existing)
+            docs = [doc for doc in docs if doc['id'] in existing]
+            ops = [UpdateOne(_key(doc), {"$set": doc}) for doc in docs]
+        else:
+            ops = [ReplaceOne(_key(doc), doc, upsert=True) for doc in docs]
+        if not ops:
+            return []
+        try:
+            await db[name].bulk_write(ops, ordered=False)
+            counts[name] += len(ops)
+            return []
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(err['code'] != 11000 for err in errors):
+                raise
+            counts[name] += len(ops) - len(errors)
+            return [docs[err['index']] for err in errors]
+
+    async def flush(name: str):
+        docs, batches[name] = batches[name], []
+        if not docs:
+            return
+        refused = await write(name, docs)
+        if replace and name != "users":
+            deferred.setdefault(name, []).extend(refused)
+        elif refused:
+            conflicts.setdefault(name, []).extend(doc['id'] for doc in refused)
+
+    header = None
+    try:
+        async for line in _lines(chunks):
+            record = json_util.loads(line)
+            if not isinstance(record, dict):
+                raise HTTPException(status_code=400, detail="Malformed backup record")
+            if header is None:
+                if record.get('format') != FORMAT or record.get('version') != VERSION:
+                    raise HTTPException(status_code=400, detail="Not a backup archive")
+                if record.get('society_id') != society_id:
+                    raise HTTPException(status_code=400, detail="Backup belongs to another society")
+                header = record
+                continue
+            name, doc = record.get('collection'), record.get('doc')
+            if name not in COLLECTIONS or not isinstance(doc, dict) or not doc.get('id'):
+                raise HTTPException(status_code=400, detail="Malformed backup record")
+            doc.pop('_id', None)
+            doc.pop('password_hash', None)
+            doc.pop(RESTORE_MARK, None)
+            doc['society_id'] = society_id
+            if replace and name != "users":
+                doc[RESTORE_MARK] = run
+            batches[name].append(doc)
+            if len(batches[name]) >= batch_size:
+                await flush(name)
+    except (zlib.error, json.JSONDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable backup archive: {e}")
+    if header is None:
+        raise HTTPException(status_code=400, detail="Empty backup archive")
+    for name in COLLECTIONS:
+        await flush(name)
+    if replace:
+        # Collections missing from an older archive are left as they are.
+        replaced = [name for name in COLLECTIONS if name != "users" and name in (header.get('collections') or [])]
+        for name in replaced:
+            stale = {"society_id": society_id, RESTORE_MARK: {"$ne": run}}
+            rewritten = [doc['id'] for doc in deferred.get(name, [])]
+            result = await db[name].delete_many({**stale, "id": {"$nin": rewritten}})
+            deleted[name] = result.deleted_count
+            # Older versions of refused documents; written again just below.
+            await db[name].delete_many({**stale, "id": {"$in": rewritten}})
+        # A refused document may wait on another one still being rewritten, so retry while that helps.
+        while deferred:
+            pending = sum(len(docs) for docs in deferred.values())
+            deferred = {name: refused for name, docs in deferred.items() if (refused := await write(name, docs))}
+            if sum(len(docs) for docs in deferred.values()) == pending:
+                break
+        for name, docs in deferred.items():
+            conflicts[name] = [doc['id'] for doc in docs]
+        for name in replaced:
+            await db[name].update_many({"society_id": society_id, RESTORE_MARK: {"$exists": True}},
+                                       {"$unset": {RESTORE_MARK: ""}})
+    return {"restored": counts, "skipped_users": skipped_users, "conflicts": conflicts, "deleted": deleted}
+
+
+def _key(doc: dict) -> dict:
+    return {"society_id": doc['society_id'], "id": doc['id']}
@@ -0,0 +1,120 @@
+"""Several API calls in one HTTP request.
+
+``POST /api/batch`` takes ``{"requests": [{"id", "method", "path", "body"}]}``
+with paths relative to ``/api`` (as the frontend's axios client writes them, query
+string included) and answers ``{"responses": [{"id", "path", "status", "body"}]}``
+in the same order.
+
+Sub-requests are handed straight to the application's router and run
+concurrently, so they skip the middleware stack and share the identity resolved
+for the batch: the token is decoded and checked against the revocation list
+once, and the caller's user document is read at most once. Each sub-request
+still goes through its route's validation, dependencies and exception handlers
+and gets its own status; one failing does not fail the others. Because they run
+concurrently, a batch should not hold writes that depend on each other.
+"""
+import asyncio
+import json
+import logging
+from typing import Iterable, List
+from urllib.parse import urlsplit
+
+from fastapi import HTTPException
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+logger = logging.getLogger(__name__)
+
+# Scope key under which sub-requests find the batch's already verified token payload.
+SHARED_USER_KEY = "apartment.batch_user"
+
+METHODS = {"GET", "POST", "PUT", "DELETE"}
+# Set per request by the client or the server; never forwarded to a sub-request.
+REQUEST_HEADERS = {b"content-length", b"content-type", b"content-encoding", b"transfer-encoding", b"expect"}
+# Copied from the batch's scope; the routing keys of the batch route are not.
+SCOPE_KEYS = ("type", "asgi", "http_version", "scheme", "server", "client", "root_path", "app",
+              "state", "starlette.exception_handlers")
+
+
+class BatchRunner:
+    def __init__(self, app, prefix: str, excluded: Iterable[str], max_requests: int = 20):
+        self.app = app
+        self.prefix = prefix
+        self.excluded = set(excluded)
+        self.max_requests = max_requests
+
+    def validate(self, requests: list):
+        if not requests:
+            raise HTTPException(status_code=400, detail="Batch is empty")
+        if len(requests) > self.max_requests:
+            raise HTTPException(status_code=400, detail=f"At most {self.max_requests} requests per batch")
+        for sub in requests:
+            split = urlsplit(sub.path)
+            if split.scheme or split.netloc or not split.path.startswith("/"):
+                raise HTTPException(status_code=400, detail=f"Invalid path: {sub.path}")
+            if sub.method.upper() not in METHODS:
+                raise HTTPException(status_code=400, detail=f"Method not allowed in a batch: {sub.method}")
+            if self.prefix + split.path.rstrip("/") in self.excluded:
+                raise HTTPException(status_code=400, detail=f"Not allowed in a batch: {split.path}")
+
+    async def run(self, scope: dict, requests: list, user: dict) -> List[dict]:
+        self.validate(requests)
+        return list(await asyncio.gather(*[self._dispatch(scope, sub, user) for sub in requests]))
+
+    async def _dispatch(self, parent: dict, sub, user: dict) -> dict:
+        split = urlsplit(sub.path)
+        path = self.prefix + split.path
+        body = b"" if sub.body is None else json.dumps(sub.body).encode('utf-8')
+        headers = [(name, value) for name, value in parent["headers"] if name not in REQUEST_HEADERS]
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        scope = {key: parent[key] for key in SCOPE_KEYS if key in parent}
+        scope.update({
+            "method": sub.method.upper(),
+            "path": path,
+            "raw_path": path.encode('utf-8'),
+            "query_string": split.query.encode('utf-8'),
+            "headers": headers,
+            SHARED_USER_KEY: user,
+        })
+
+        done = asyncio.Event()
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Only a streaming response keeps listening; it is not disconnected early.
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        response = {"status": 500, "headers": [], "body": []}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        try:
+            await self.app.router(scope, receive, send)
+        except StarletteHTTPException as e:
+            # Raised by the router itself (no such path or method) rather than by a route.
+            return {"id": sub.id, "path": sub.path, "status": e.status_code, "body": {"detail": e.detail}}
+        except Exception:
+            logger.exception("Batched %s %s failed", sub.method, sub.path)
+            return {"id": sub.id, "path": sub.path, "status": 500, "body": {"detail": "Internal Server Error"}}
+        finally:
+            done.set()
+        return {"id": sub.id, "path": sub.path, "status": response["status"], "body": _decode(response)}
+
+
+def _decode(response: dict):
+    content = b"".join(response["body"])
+    if not content:
+        return None
+    content_type = dict(response["headers"]).get(b"content-type", b"")
+    if content_type.startswith(b"application/json"):
+        return json.loads(content)
+    return content.decode('utf-8', errors='replace')
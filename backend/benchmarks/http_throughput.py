@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Requests-per-second benchmark for a running backend.
+
+Fires requests at one endpoint from a fixed number of concurrent connections for
+a fixed duration and prints throughput and latency percentiles. To compare the
+development and production launchers, run the same benchmark against each:
+
+    # development: single process with the reloader
+    uvicorn server:app --port 8001 --reload
+    python benchmarks/http_throughput.py --url http://localhost:8001/api/auth/me --token $TOKEN
+
+    # production: serve.py with one worker per CPU
+    python serve.py
+    python benchmarks/http_throughput.py --url http://localhost:8001/api/auth/me --token $TOKEN
+
+Record the numbers with the CPU count and WEB_CONCURRENCY used; they are only
+comparable on the same machine.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def worker(client: httpx.AsyncClient, url: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(url)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Requests-per-second benchmark for a running backend")
+    parser.add_argument("--url", default="http://localhost:8001/api/auth/me")
+    parser.add_argument("--token", default=None, help="Bearer token for authenticated endpoints")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    latencies, errors = [], []
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[
+            worker(client, args.url, deadline, latencies, errors) for _ in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    print(f"requests:   {len(latencies)} ({len(errors)} errors)")
+    print(f"throughput: {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(f"latency:    mean {statistics.mean(latencies) * 1000:.1f} ms, "
+              f"p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:.1f} ms, "
+              f"p99 {percentile(latencies, 99) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
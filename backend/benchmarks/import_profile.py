@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Import-time and memory report for ``import server``.
+
+Runs ``python -X importtime`` in a fresh interpreter and prints the total import
+time, the slowest top-level packages and the resident set size once the import
+has finished. ``--eager`` also imports the payment SDKs up front, which is what
+every worker did before the gateways were loaded lazily, so the two runs give
+before and after figures on the same machine:
+
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --eager
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+EAGER_IMPORTS = [
+    "razorpay",
+    "emergentintegrations.payments.stripe.checkout",
+]
+
+CHILD = """
+import importlib, resource, sys
+for name in {eager!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError as e:
+        print(f"skipped {{name}}: {{e}}", file=sys.stdout)
+import server
+print(f"maxrss_kb {{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}")
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and memory report for the backend")
+    parser.add_argument("--eager", action="store_true", help="import payment SDKs at startup, as before")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "apartment_import_profile")
+    code = CHILD.format(eager=EAGER_IMPORTS if args.eager else [])
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-2000:])
+        sys.exit(result.returncode)
+
+    # Lines look like "import time:   self [us] |  cumulative | imported package".
+    packages = defaultdict(int)
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _cumulative_us, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        packages[name.strip().split(".")[0]] += int(self_us)
+
+    for line in result.stdout.splitlines():
+        if line.startswith("skipped"):
+            print(line)
+    rss_kb = next(int(line.split()[1]) for line in result.stdout.splitlines() if line.startswith("maxrss_kb"))
+
+    print(f"mode:        {'eager' if args.eager else 'lazy'}")
+    print(f"import time: {total_us / 1000:.1f} ms")
+    print(f"max RSS:     {rss_kb / 1024:.1f} MiB")
+    print(f"top {args.top} packages by self time:")
+    for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Insert-throughput benchmark: random uuid4 ids vs time-ordered UUIDv7 ids.
+
+Inserts payment-shaped documents into scratch collections that carry a unique
+index on ``id`` (the field every lookup uses) and reports documents per second.
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/insert_ids.py --count 200000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import ids  # noqa: E402
+
+
+def make_doc(doc_id: str, n: int) -> dict:
+    return {
+        "id": doc_id,
+        "flat_id": f"flat-{n % 500}",
+        "flat_number": f"A-{n % 500}",
+        "month": n % 12 + 1,
+        "year": 2020 + n % 5,
+        "amount": 2500.0,
+        "payment_method": "cash",
+        "status": "paid",
+    }
+
+
+async def run(db, name: str, generator, count: int, batch: int) -> float:
+    collection = db[f"bench_ids_{name}"]
+    await collection.drop()
+    await collection.create_index("id", unique=True)
+
+    start = time.perf_counter()
+    for offset in range(0, count, batch):
+        docs = [make_doc(generator(), n) for n in range(offset, min(offset + batch, count))]
+        await collection.insert_many(docs, ordered=False)
+    elapsed = time.perf_counter() - start
+
+    stats = await db.command("collStats", collection.name)
+    index_kb = stats.get("indexSizes", {}).get("id_1", 0) / 1024
+    print(f"{name:6s} {count / elapsed:>10.0f} docs/s  {elapsed:6.2f}s  id index {index_kb:,.0f} KiB")
+    await collection.drop()
+    return count / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("BENCH_DB_NAME", "apartment_bench")]
+    try:
+        for name, generator in ids.STRATEGIES.items():
+            await run(db, name, generator, args.count, args.batch)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Legitimate login latency with and without a credential-stuffing burst.
+
+Measures a legitimate user's login latency on a quiet server, then again while
+attacker tasks hammer /api/auth/login with wrong passwords for registered
+accounts from many spoofed addresses. Login answers an unknown email before
+hashing anything, so only attempts on accounts that exist cost a bcrypt hash;
+``--victim`` names them (repeat it for several) and defaults to ``--email``.
+Run the server with ``FORWARDED_ALLOW_IPS=127.0.0.1`` (the serve.py default) so
+the X-Forwarded-For addresses are honoured, and register the accounts first:
+
+    python serve.py
+    python benchmarks/login_under_attack.py --email admin@example.com --password secret \
+        --victim resident1@example.com --victim resident2@example.com
+
+Without rate limiting every attacker request burns a bcrypt hash and the
+legitimate p95 climbs with the attack; with it, each victim's per-email bucket
+runs dry after a few attempts, attackers get 429 before any hashing and the
+legitimate latency stays close to the quiet baseline. Attacking ``--email``
+itself also locks the legitimate user out (429) until the attack stops.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+
+async def legitimate(client, url, email, password, count, latencies):
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.post(url, json={"email": email, "password": password},
+                                     headers={"X-Forwarded-For": "10.0.0.1"})
+        latencies.append((time.perf_counter() - start, response.status_code))
+        await asyncio.sleep(0.2)
+
+
+async def attacker(client, url, victims, stop: asyncio.Event, statuses: Counter):
+    while not stop.is_set():
+        ip = f"203.0.{random.randint(0, 255)}.{random.randint(1, 254)}"
+        email = random.choice(victims)
+        try:
+            response = await client.post(url, json={"email": email, "password": "wrong"},
+                                         headers={"X-Forwarded-For": ip})
+            statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+
+
+def summarize(label, latencies):
+    times = sorted(t for t, _ in latencies)
+    codes = Counter(code for _, code in latencies)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:14s} p50 {statistics.median(times) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms  statuses {dict(codes)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Legitimate login latency during a credential-stuffing burst")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=4, help="legitimate logins per phase (stay under the per-email limit)")
+    parser.add_argument("--victim", action="append", default=None,
+                        help="registered email to attack (repeatable; default: --email)")
+    parser.add_argument("--attackers", type=int, default=50)
+    args = parser.parse_args()
+    victims = args.victim or [args.email]
+
+    url = f"{args.base_url}/api/auth/login"
+    async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=args.attackers + 5)) as client:
+        quiet = []
+        await legitimate(client, url, args.email, args.password, args.logins, quiet)
+        summarize("quiet", quiet)
+
+        # The per-email bucket is small; let it refill before the second phase.
+        print("waiting for the legitimate user's bucket to refill...")
+        await asyncio.sleep(65)
+
+        stop, statuses, attacked = asyncio.Event(), Counter(), []
+        attack = [asyncio.create_task(attacker(client, url, victims, stop, statuses)) for _ in range(args.attackers)]
+        await asyncio.sleep(2)
+        await legitimate(client, url, args.email, args.password, args.logins, attacked)
+        stop.set()
+        await asyncio.gather(*attack)
+        summarize("under attack", attacked)
+        print(f"attacker responses: {dict(statuses)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
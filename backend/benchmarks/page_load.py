@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Page-load time over a simulated slow link, with and without ``/api/batch``.
+
+Each page is the set of API calls the frontend makes when it opens. A page is
+loaded three ways:
+
+* ``sequential`` - one call after another, as an awaited chain of requests would;
+* ``parallel`` - all calls at once (``Promise.all``), as the pages do today;
+* ``batch`` - one ``POST /api/batch`` carrying every call.
+
+Requests go through an in-process transport that models the link: one round
+trip per request, transfer time for the bytes sent and received over bandwidth
+shared by all requests, ``--handshake-rtts`` extra round trips to open each new
+connection (TCP and TLS) and at most ``--connections`` requests in flight (a
+browser's per-origin limit). Unless ``--no-preflight`` is given, every distinct
+URL first pays for a CORS preflight, as a cross-origin call with an
+``Authorization`` header does. Each load starts cold, with no open connections
+and no cached preflights; ``--warm`` keeps both between loads, as navigating
+inside the app does.
+
+    python benchmarks/page_load.py --flats 500 --rtt-ms 300 --bandwidth-kbps 1600 --loads 20
+
+Like ``suite.py`` it runs against mongomock unless ``--mongo-url`` is given.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+import suite
+
+server = suite.server
+
+ORIGIN = "http://frontend.bench"
+
+PAGES = {
+    "admin-overview": ["/auth/me", "/dashboard/stats", "/flats", "/charges", "/payments"],
+    "admin-dashboard": ["/dashboard/stats", "/admin/pending"],
+    "dues": ["/flats", "/payments", "/charges"],
+    "payments": ["/payments", "/flats"],
+}
+
+
+class SlowLink(httpx.AsyncBaseTransport):
+    """Runs requests against the app in-process as if over a slow network link."""
+
+    def __init__(self, app, rtt: float, bandwidth: float, connections: int, handshake_rtts: int):
+        self.inner = httpx.ASGITransport(app=app)
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.handshake_rtts = handshake_rtts
+        self.slots = asyncio.Semaphore(connections)
+        self.pipe = asyncio.Lock()
+        self.idle = 0
+        self.requests = 0
+        self.connections = 0
+        self.bytes = 0
+
+    def disconnect(self):
+        self.idle = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async with self.slots:
+            if self.idle:
+                self.idle -= 1
+            else:
+                self.connections += 1
+                await asyncio.sleep(self.rtt * self.handshake_rtts)
+            try:
+                response = await self.inner.handle_async_request(request)
+                body = await response.aread()
+                size = len(request.content) + len(body)
+                self.requests += 1
+                self.bytes += size
+                await asyncio.sleep(self.rtt)
+                async with self.pipe:
+                    await asyncio.sleep(size / self.bandwidth)
+            finally:
+                self.idle += 1
+            return httpx.Response(response.status_code, headers=response.headers, content=body)
+
+
+class Browser:
+    """Sends calls the way the frontend does, with a preflight cache per page load."""
+
+    def __init__(self, client: httpx.AsyncClient, link: SlowLink, headers: dict, preflight: bool, warm: bool):
+        self.client = client
+        self.link = link
+        self.warm = warm
+        self.headers = {**headers, "Origin": ORIGIN}
+        self.preflight = preflight
+        self.preflighted = set()
+        self.errors = 0
+
+    async def call(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if self.preflight and (method, url) not in self.preflighted:
+            self.preflighted.add((method, url))
+            await self.client.options(url, headers={
+                "Origin": ORIGIN,
+                "Access-Control-Request-Method": method,
+                "Access-Control-Request-Headers": "authorization,content-type",
+            })
+        response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+    async def load(self, mode: str, paths: list):
+        if not self.warm:
+            self.preflighted.clear()
+            self.link.disconnect()
+        if mode == "sequential":
+            for path in paths:
+                await self.call("GET", f"/api{path}")
+        elif mode == "parallel":
+            await asyncio.gather(*[self.call("GET", f"/api{path}") for path in paths])
+        else:
+            response = await self.call("POST", "/api/batch", json={
+                "requests": [{"method": "GET", "path": path} for path in paths]
+            })
+            self.errors += sum(1 for sub in response.json().get("responses", []) if sub["status"] >= 400)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Page-load time over a slow link")
+    parser.add_argument("--mongo-url", default=None, help="use a real mongod instead of the in-memory stand-in")
+    parser.add_argument("--flats", type=int, default=200)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--rtt-ms", type=float, default=300.0)
+    parser.add_argument("--bandwidth-kbps", type=float, default=1600.0)
+    parser.add_argument("--connections", type=int, default=6, help="concurrent requests per origin")
+    parser.add_argument("--handshake-rtts", type=int, default=2, help="round trips to open a connection")
+    parser.add_argument("--warm", action="store_true", help="keep connections and preflights between loads")
+    parser.add_argument("--no-preflight", action="store_true", help="assume same-origin calls (no CORS preflight)")
+    parser.add_argument("--loads", type=int, default=10, help="page loads per page and mode")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    suite.install_gateway_stubs()
+    db = suite.connect(args.mongo_url)
+    await suite.reset(db)
+    data = await suite.seed(db, args.flats, args.years, residents=0)
+    admin = data["admin"]
+    # The admin dashboard only asks for pending approvals as the super admin.
+    await db.users.update_one({"id": admin["id"]}, {"$set": {"is_super_admin": True}})
+    token = server.create_token(admin['id'], admin['email'], 'admin', data["society_id"])
+
+    await server.audit_log.start()
+    link = SlowLink(server.app, args.rtt_ms / 1000, args.bandwidth_kbps * 1000 / 8, args.connections,
+                    args.handshake_rtts)
+    pages = {}
+    async with httpx.AsyncClient(transport=link, base_url="http://bench", timeout=300) as client:
+        browser = Browser(client, link, {"Authorization": f"Bearer {token}"},
+                          preflight=not args.no_preflight, warm=args.warm)
+        for page, paths in PAGES.items():
+            pages[page] = {}
+            for mode in ("sequential", "parallel", "batch"):
+                timings = []
+                requests_before, connections_before, bytes_before = link.requests, link.connections, link.bytes
+                for _ in range(args.loads):
+                    started = time.perf_counter()
+                    await browser.load(mode, paths)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                pages[page][mode] = {
+                    "p50_ms": round(suite.percentile(timings, 50), 1),
+                    "p95_ms": round(suite.percentile(timings, 95), 1),
+                    "requests_per_load": (link.requests - requests_before) / args.loads,
+                    "connections_per_load": (link.connections - connections_before) / args.loads,
+                    "kb_per_load": round((link.bytes - bytes_before) / args.loads / 1024, 1),
+                }
+            for baseline in ("sequential", "parallel"):
+                pages[page][f"batch_speedup_vs_{baseline}"] = round(
+                    pages[page][baseline]["p50_ms"] / pages[page]["batch"]["p50_ms"], 2
+                )
+
+    report = {
+        "backend": "mongod" if args.mongo_url else "mongomock",
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "errors": browser.errors,
+        "pages": pages,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    await server.audit_log.stop()
+    server.client.close()
+    sys.exit(1 if browser.errors else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
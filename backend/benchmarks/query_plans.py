@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Check that the flat search and payment filter queries are served by indexes.
+
+Creates the production indexes in a scratch database on a real mongod, seeds a
+few documents and runs ``explain`` on every query shape the list endpoints can
+issue. Exits non-zero if any winning plan contains a collection scan, so it can
+gate a CI job:
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/query_plans.py
+
+``tests/test_query_plans.py`` runs the same cases under pytest.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from indexes import ensure_indexes  # noqa: E402
+from search import flat_search_query, payment_filter_query, search_keys  # noqa: E402
+from tenancy import scoped as scoped_to  # noqa: E402
+
+CREATED_DESC = {"created_at": -1}
+SOCIETY = "society-1"
+CALLER = {"society_id": SOCIETY}
+
+
+def scoped(query):
+    return scoped_to(CALLER, query)
+
+
+CASES = [
+    ("flats: search by flat number", "flats", scoped(flat_search_query("A-10")), {"flat_number": 1}),
+    ("flats: search by owner name", "flats", scoped(flat_search_query("sharma")), {"flat_number": 1}),
+    ("flats: search by phone", "flats", scoped(flat_search_query("98765")), {"flat_number": 1}),
+    ("payments: by flat", "payments", scoped(payment_filter_query(flat_id="flat-1")), CREATED_DESC),
+    ("payments: month range", "payments", scoped(payment_filter_query(from_month="2024-04", to_month="2025-03")), CREATED_DESC),
+    ("payments: by method", "payments", scoped(payment_filter_query(payment_method="cash")), CREATED_DESC),
+    ("payments: by status", "payments", scoped(payment_filter_query(status="paid")), CREATED_DESC),
+    ("payments: amount range", "payments", scoped(payment_filter_query(min_amount=1000, max_amount=5000)), CREATED_DESC),
+    ("payments: flat and month range", "payments",
+     scoped(payment_filter_query(flat_id="flat-1", from_month="2024-01", to_month="2024-12")), CREATED_DESC),
+]
+
+
+def stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "innerStage", "outerStage"):
+        if key in plan:
+            yield from stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from stages(child)
+
+
+def plan_stages(explained: dict) -> list:
+    return [stage for stage in stages(explained["queryPlanner"]["winningPlan"]) if stage]
+
+
+async def prepare(db):
+    """Create the production indexes and a few documents in an empty database."""
+    await ensure_indexes(db)
+    flat = {"id": "flat-1", "flat_number": "A-101", "owner_name": "Asha Sharma",
+            "owner_email": "asha@example.com", "owner_phone": "+91 98765 43210"}
+    await db.flats.insert_one({**flat, "society_id": SOCIETY, "search_keys": search_keys(flat)})
+    await db.payments.insert_many([
+        {"id": f"p-{n}", "society_id": SOCIETY, "flat_id": "flat-1", "month": n % 12 + 1, "year": 2024 + n // 12, "amount": 2500.0,
+         "payment_method": "cash", "status": "paid", "receipt_number": f"REC-{n}", "created_at": str(n)}
+        for n in range(24)
+    ])
+
+
+async def main():
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("PLAN_DB_NAME", "apartment_query_plans")]
+    await client.drop_database(db.name)
+    await prepare(db)
+
+    failures = 0
+    for label, collection, query, sort in CASES:
+        explained = await db.command("explain", {"find": collection, "filter": query, "sort": sort},
+                                     verbosity="queryPlanner")
+        found = plan_stages(explained)
+        ok = "COLLSCAN" not in found
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:32s} {' <- '.join(found)}")
+
+    await client.drop_database(db.name)
+    client.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Throughput of the dues-reminder pipeline against a local SMTP sink.
+
+Seeds a society (as ``suite.py`` does, leaving part of the current month
+unpaid), starts ``smtp_sink.py`` in-process and sends the month's reminders
+through the real ``SMTPTransport``. It then runs the month again to check that
+the reminder log stops every message from going out twice.
+
+    python benchmarks/reminder_throughput.py --mongo-url mongodb://localhost:27017 --flats 5000 --rate 1000/1
+
+The unpaid-flats query uses a correlated ``$lookup``, which the in-memory
+stand-in does not implement, so a mongod is required.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import suite
+from smtp_sink import SMTPSink
+
+from reminders import Reminders, SMTPTransport
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Dues-reminder pipeline benchmark")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--flats", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--rate", default="1000/1", help="SMTP token bucket, <burst>/<seconds>")
+    args = parser.parse_args()
+
+    random.seed(1)
+    db = suite.connect(args.mongo_url)
+    await suite.reset(db)
+    await db.reminder_log.drop()
+    data = await suite.seed(db, args.flats, years=1, residents=0)
+    society_id = data["society_id"]
+    month, year = data["current"]
+
+    sink = SMTPSink()
+    port = await sink.start()
+    transport = SMTPTransport("127.0.0.1", port, sender="dues@example.com", rate=args.rate)
+    reminders = Reminders(db, [transport], concurrency=args.concurrency, batch_size=args.batch_size)
+
+    started = time.perf_counter()
+    first = await reminders.send_month(society_id, year, month)
+    elapsed = time.perf_counter() - started
+    second = await reminders.send_month(society_id, year, month)
+
+    await reminders.close()
+    await sink.stop()
+    print(json.dumps({
+        "flats": args.flats,
+        "first_run": first,
+        "elapsed_s": round(elapsed, 2),
+        "messages_per_s": round(first["sent"] / elapsed, 1) if elapsed else 0,
+        "sink_received": sink.received,
+        "second_run": second,
+    }, indent=2))
+    suite.server.client.close()
+    sys.exit(0 if second["sent"] == 0 and sink.received == first["sent"] else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
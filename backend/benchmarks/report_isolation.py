@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Checkout latency with and without concurrent report load.
+
+Dashboards and reports read through a separate secondaryPreferred pool with a
+maxTimeMS cap. This benchmark checks that the split works: it measures the
+Stripe checkout path (stubbed gateway) on its own, then again while report
+clients hammer /api/dashboard/stats, and prints both latency profiles. Point it
+at a local replica set so report reads really go to a secondary:
+
+    mongod --replSet rs0 --port 27017 --dbpath /tmp/rs0-0 &
+    mongod --replSet rs0 --port 27018 --dbpath /tmp/rs0-1 &
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [{_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}]})'
+    python benchmarks/report_isolation.py --mongo-url "mongodb://localhost:27017,localhost:27018/?replicaSet=rs0"
+
+With the split in place the checkout p99 under report load should stay close
+to the quiet p99.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+import httpx
+
+import suite
+
+CHECKOUT = "POST /payments/checkout+status"
+REPORT = "GET /dashboard/stats"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Checkout latency with and without report load")
+    parser.add_argument("--mongo-url", default=None, help="replica set URL; omit for the in-memory stand-in")
+    parser.add_argument("--flats", type=int, default=5000)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--checkout-clients", type=int, default=16)
+    parser.add_argument("--report-clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    random.seed(1)
+    suite.install_gateway_stubs()
+    db = suite.connect(args.mongo_url)
+    await suite.reset(db)
+    data = await suite.seed(db, args.flats, args.years, residents=10)
+    mix = {name: (name, weight, call) for name, weight, call in suite.build_mix(data)}
+
+    transport = httpx.ASGITransport(app=suite.server.app)
+    limits = httpx.Limits(max_connections=args.checkout_clients + args.report_clients)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=120) as client:
+        quiet = await suite.drive(client, [mix[CHECKOUT]], args.checkout_clients, args.duration)
+        loaded, reports = await asyncio.gather(
+            suite.drive(client, [mix[CHECKOUT]], args.checkout_clients, args.duration),
+            suite.drive(client, [mix[REPORT]], args.report_clients, args.duration),
+        )
+
+    print(json.dumps({
+        "backend": "mongod" if args.mongo_url else "mongomock",
+        "checkout_quiet": quiet["endpoints"][CHECKOUT],
+        "checkout_under_report_load": loaded["endpoints"][CHECKOUT],
+        "reports": reports["endpoints"][REPORT],
+    }, indent=2))
+    suite.server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""A local SMTP server that accepts and discards every message.
+
+Use it as the reminder transport in development and benchmarks:
+
+    python benchmarks/smtp_sink.py --port 1025
+    REMINDER_SMTP_HOST=localhost REMINDER_SMTP_PORT=1025 REMINDER_SMTP_STARTTLS=0 uvicorn server:app
+
+It speaks just enough SMTP for ``smtplib`` (no TLS, no auth) and counts what it
+receives; ``--verbose`` prints each message's recipients and subject.
+"""
+import argparse
+import asyncio
+from email.parser import BytesHeaderParser
+
+
+class SMTPSink:
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+        self.received = 0
+        self.server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._session, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _session(self, reader, writer):
+        writer.write(b"220 smtp-sink ready\r\n")
+        recipients = []
+        try:
+            while line := await reader.readline():
+                command = line[:4].upper()
+                if command in (b"EHLO", b"HELO"):
+                    writer.write(b"250 smtp-sink\r\n")
+                elif command == b"RCPT":
+                    recipients.append(line[8:].strip().decode(errors="replace"))
+                    writer.write(b"250 OK\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    data = await reader.readuntil(b"\r\n.\r\n")
+                    self.received += 1
+                    if self.verbose:
+                        headers = BytesHeaderParser().parsebytes(data)
+                        print(f"{', '.join(recipients)}: {headers['Subject']}")
+                    recipients = []
+                    writer.write(b"250 OK queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    break
+                else:
+                    # MAIL, RSET, NOOP and anything else.
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    sink = SMTPSink(verbose=args.verbose)
+    port = await sink.start(args.host, args.port)
+    print(f"SMTP sink listening on {args.host}:{port}")
+    async with sink.server:
+        await sink.server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""In-process load benchmark for ``server:app``.
+
+Boots the FastAPI app inside this process, points it at either a local mongod
+(``--mongo-url``) or an in-memory Motor stand-in (mongomock-motor, the default),
+stubs out Stripe and Razorpay, seeds a synthetic society and then drives a
+weighted mix of API calls from many concurrent clients. No network, no preview
+deployment and no gateway credentials are needed.
+
+    python benchmarks/suite.py --flats 1000 --years 3 --concurrency 50 --duration 30 --output bench.json
+
+The JSON report has requests per second and p50/p95/p99 latency for every
+endpoint in the mix, so two runs can be diffed to spot regressions. Absolute
+numbers against mongomock measure server-side Python cost only; use
+``--mongo-url`` for figures that include real database work.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# The server reads its configuration at import time.
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "apartment_bench")
+for limit in ("LOGIN_RATE_LIMIT_IP", "LOGIN_RATE_LIMIT_EMAIL", "REGISTER_RATE_LIMIT_IP"):
+    os.environ[limit] = "1000000/1"
+
+import httpx  # noqa: E402
+
+import gateways  # noqa: E402
+import server  # noqa: E402
+
+PASSWORD = "bench-password"
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class FakeStripeCheckout:
+    """Stand-in for emergentintegrations' StripeCheckout; every session is paid."""
+
+    sessions = {}
+
+    def __init__(self, webhook_url=""):
+        self.webhook_url = webhook_url
+
+    async def create_checkout_session(self, request):
+        session_id = f"cs_bench_{server.new_id()}"
+        self.sessions[session_id] = request.amount
+        return SimpleNamespace(session_id=session_id, url=f"https://checkout.invalid/{session_id}")
+
+    async def get_checkout_status(self, session_id):
+        amount = self.sessions.get(session_id, 0)
+        return SimpleNamespace(status="complete", payment_status="paid",
+                               amount_total=int(amount * 100), currency="usd")
+
+    async def handle_webhook(self, body, signature):
+        return SimpleNamespace(event_type="checkout.session.completed")
+
+
+class FakeRazorpayClient:
+    def __init__(self):
+        self.order = SimpleNamespace(create=lambda data: {"id": f"order_bench_{server.new_id()}", **data})
+        self.utility = SimpleNamespace(
+            verify_payment_signature=lambda params: True,
+            verify_webhook_signature=lambda body, signature, secret: True
+        )
+
+
+def install_gateway_stubs():
+    razorpay = FakeRazorpayClient()
+    gateways.stripe_checkout = lambda webhook_url="": FakeStripeCheckout(webhook_url)
+    gateways.stripe_session_request = lambda **kwargs: SimpleNamespace(**kwargs)
+    gateways.razorpay_client = lambda: razorpay
+
+
+def connect(mongo_url):
+    analytics_client = None
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url)
+        analytics_client = AsyncIOMotorClient(mongo_url, readPreference="secondaryPreferred",
+                                              maxPoolSize=server.ANALYTICS_MAX_POOL_SIZE)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("mongomock-motor is required for the in-memory stand-in: pip install -r requirements-dev.txt "
+                     "(or pass --mongo-url to use a local mongod)")
+        client = AsyncMongoMockClient()
+    db = client[os.environ["DB_NAME"]]
+    server.client = client
+    server.db = db
+    server.analytics_client = analytics_client or client
+    server.analytics_db = (analytics_client or client)[os.environ["DB_NAME"]]
+    # Everything server.py built around its own client has to follow it here.
+    server.audit_log.collection = db.audit_log
+    server.payment_archive = server.PaymentArchive(db)
+    server.expense_reports = server.ExpenseReports(server.analytics_db.monthly_charges, db.report_cache,
+                                                   server.ANALYTICS_MAX_TIME_MS)
+    server.mongo_health = server.MongoHealth(client, ttl=server.mongo_health.ttl)
+    server.revocations.collection = db.revocations
+    server.reminders.db = db
+    server.scheduler.db = db
+    server.scheduler.archive = server.payment_archive
+    if isinstance(server.rate_limiter.backend, server.MongoBuckets):
+        server.rate_limiter.backend.collection = db.rate_limits
+    return db
+
+
+async def reset(db):
+    for name in ("societies", "users", "flats", "monthly_charges", "payments", "payment_transactions",
+                 "counters", "audit_log", "report_cache"):
+        await db[name].drop()
+
+
+async def seed(db, flats: int, years: int, residents: int, batch: int = 5000,
+               society_id: str = server.DEFAULT_SOCIETY_ID, password_hash: str = None):
+    """Seed one society; call ``reset`` first for a clean database."""
+    await server.ensure_society(db, society_id)
+    password_hash = password_hash or server.hash_password(PASSWORD)
+    # Emails are unique across societies.
+    email_tag = "" if society_id == server.DEFAULT_SOCIETY_ID else f".{society_id}"
+    now = datetime.now(timezone.utc)
+    months = [((now.month - 1 - i) % 12 + 1, now.year + (now.month - 1 - i) // 12) for i in range(years * 12)]
+
+    await db.monthly_charges.insert_many([
+        server.MonthlyCharge(society_id=society_id, month=m, year=y, base_charge=2500.0,
+                             breakdown={"maintenance": 1500.0, "security": 600.0, "water": 400.0}).model_dump()
+        for m, y in months
+    ])
+
+    flat_docs = [
+        server.Flat(society_id=society_id, flat_number=f"{chr(65 + n % 8)}-{n:05d}", owner_name=f"Owner {n}",
+                    owner_email=f"owner{n}@example.com", owner_phone=f"+91{9000000000 + n}",
+                    flat_size="2BHK", custom_charge=3000.0 if n % 10 == 0 else None).model_dump()
+        for n in range(flats)
+    ]
+    for offset in range(0, len(flat_docs), batch):
+        await db.flats.insert_many(flat_docs[offset:offset + batch])
+
+    users = [server.User(society_id=society_id, email=f"admin{email_tag}@example.com", name="Bench Admin",
+                         role="admin", is_super_admin=True).model_dump()]
+    users += [
+        server.User(society_id=society_id, email=f"resident{n}{email_tag}@example.com", name=f"Resident {n}",
+                    role="resident",
+                    flat_number=flat_docs[n]["flat_number"]).model_dump()
+        for n in range(min(residents, flats))
+    ]
+    for user in users:
+        user["password_hash"] = password_hash
+    await db.users.insert_many(users)
+
+    # Most flats pay most months; the current month is left partly unpaid.
+    pending = []
+    payments = 0
+    for month, year in months:
+        current = (month, year) == months[0]
+        for flat in flat_docs:
+            if random.random() < (0.6 if current else 0.95):
+                pending.append(server.Payment(
+                    society_id=society_id, flat_id=flat["id"], flat_number=flat["flat_number"], month=month, year=year,
+                    amount=flat["custom_charge"] or 2500.0, payment_date=now.isoformat(),
+                    payment_method=random.choice(["cash", "stripe", "razorpay"]),
+                    receipt_number=f"REC-SEED{email_tag}-{payments:08d}", status="paid"
+                ).model_dump())
+                payments += 1
+            if len(pending) >= batch:
+                await db.payments.insert_many(pending)
+                pending = []
+    if pending:
+        await db.payments.insert_many(pending)
+
+    return {
+        "society_id": society_id, "flats": flats, "months": len(months), "payments": payments, "users": len(users),
+        "admin": users[0], "residents": users[1:], "flat_docs": flat_docs, "current": months[0]
+    }
+
+
+def build_mix(data):
+    admin = data["admin"]
+    society_id = data["society_id"]
+    admin_headers = {"Authorization": f"Bearer {server.create_token(admin['id'], admin['email'], 'admin', society_id)}"}
+    resident_headers = [
+        {"Authorization": f"Bearer {server.create_token(r['id'], r['email'], 'resident', society_id)}"}
+        for r in data["residents"]
+    ]
+    flats = data["flat_docs"]
+    month, year = data["current"]
+
+    async def login(client):
+        user = random.choice(data["residents"]) if data["residents"] else admin
+        return await client.post("/api/auth/login", json={"email": user["email"], "password": PASSWORD})
+
+    async def dashboard_stats(client):
+        return await client.get("/api/dashboard/stats", headers=admin_headers)
+
+    async def resident_dashboard(client):
+        return await client.get("/api/dashboard/resident", headers=random.choice(resident_headers))
+
+    async def list_flats(client):
+        return await client.get("/api/flats", headers=admin_headers)
+
+    async def list_payments(client):
+        return await client.get("/api/payments", headers=random.choice(resident_headers))
+
+    async def list_charges(client):
+        return await client.get("/api/charges", headers=admin_headers)
+
+    async def stripe_checkout(client):
+        flat = random.choice(flats)
+        response = await client.post("/api/payments/checkout", headers=admin_headers, json={
+            "flat_id": flat["id"], "month": month, "year": year, "origin_url": "https://bench.invalid"
+        })
+        if response.status_code != 200:
+            return response
+        session_id = response.json()["session_id"]
+        return await client.get(f"/api/payments/checkout/status/{session_id}", headers=admin_headers)
+
+    async def razorpay_order(client):
+        flat = random.choice(flats)
+        return await client.post("/api/payments/razorpay/create-order", headers=admin_headers, json={
+            "flat_id": flat["id"], "month": month, "year": year
+        })
+
+    # (name, weight, call)
+    mix = [
+        ("POST /auth/login", 5, login),
+        ("GET /dashboard/stats", 10, dashboard_stats),
+        ("GET /dashboard/resident", 25, resident_dashboard),
+        ("GET /flats", 10, list_flats),
+        ("GET /payments", 25, list_payments),
+        ("GET /charges", 10, list_charges),
+        ("POST /payments/checkout+status", 8, stripe_checkout),
+        ("POST /payments/razorpay/create-order", 7, razorpay_order),
+    ]
+    if not resident_headers:
+        mix = [entry for entry in mix if entry[0] not in ("GET /dashboard/resident", "GET /payments")]
+    return mix
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def drive(client, mix, concurrency, duration):
+    names = [name for name, _, _ in mix]
+    weights = [weight for _, weight, _ in mix]
+    calls = {name: call for name, _, call in mix}
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    async def user_loop(deadline):
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await calls[name](client)
+                if response.status_code >= 400:
+                    errors[name] += 1
+            except Exception:
+                errors[name] += 1
+            latencies[name].append(time.perf_counter() - start)
+            # The in-memory stand-in never suspends, so yield explicitly to keep clients fair.
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[user_loop(started + duration) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name in names:
+        ordered = sorted(latencies[name])
+        endpoints[name] = {
+            "requests": len(ordered),
+            "errors": errors[name],
+            "rps": round(len(ordered) / elapsed, 2),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        }
+    total = sum(len(v) for v in latencies.values())
+    return {"elapsed_s": round(elapsed, 2), "requests": total, "rps": round(total / elapsed, 2),
+            "errors": sum(errors.values()), "endpoints": endpoints}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="In-process load benchmark for the backend")
+    parser.add_argument("--mongo-url", default=None, help="use a real mongod instead of the in-memory stand-in")
+    parser.add_argument("--flats", type=int, default=500)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--residents", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    install_gateway_stubs()
+    db = connect(args.mongo_url)
+
+    seed_start = time.perf_counter()
+    await reset(db)
+    data = await seed(db, args.flats, args.years, args.residents)
+    seed_elapsed = time.perf_counter() - seed_start
+    print(f"seeded {data['flats']} flats, {data['payments']} payments in {seed_elapsed:.1f}s", file=sys.stderr)
+
+    await server.audit_log.start()
+    transport = httpx.ASGITransport(app=server.app)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=120) as client:
+        results = await drive(client, build_mix(data), args.concurrency, args.duration)
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "backend": "mongod" if args.mongo_url else "mongomock",
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "dataset": {k: data[k] for k in ("flats", "months", "payments", "users")},
+        "seed_s": round(seed_elapsed, 2),
+        **results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    await server.audit_log.stop()
+    server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Per-tenant load benchmark for a multi-society deployment.
+
+Seeds ``--societies`` societies side by side in one database, checks that no
+request can see another society's flats or payments, then drives the usual
+endpoint mix for every society at once and reports latency per society. A
+``--noisy-clients`` count adds extra clients to the first society to show how
+much one busy tenant slows the others down.
+
+    python benchmarks/tenants.py --societies 50 --flats 200 --duration 30 --mongo-url mongodb://localhost:27017
+
+Exits non-zero if the isolation check fails. Like ``suite.py`` it runs against
+mongomock unless ``--mongo-url`` is given.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+import suite
+
+server = suite.server
+
+
+async def check_isolation(client, tenants) -> list:
+    """Each society's admin sees exactly its own flats, residents only their own payments."""
+    problems = []
+    for data in tenants:
+        society_id = data["society_id"]
+        admin = data["admin"]
+        headers = {"Authorization": f"Bearer {server.create_token(admin['id'], admin['email'], 'admin', society_id)}"}
+        flats = (await client.get("/api/flats", headers=headers, params={"limit": 1000})).json()
+        own = {flat["id"] for flat in data["flat_docs"]}
+        if {flat["id"] for flat in flats} != own or any(flat["society_id"] != society_id for flat in flats):
+            problems.append(f"{society_id}: /api/flats returned flats of another society")
+        for resident in data["residents"][:3]:
+            token = server.create_token(resident['id'], resident['email'], 'resident', society_id)
+            payments = (await client.get("/api/payments", headers={"Authorization": f"Bearer {token}"})).json()
+            if any(payment["society_id"] != society_id or payment["flat_id"] not in own for payment in payments):
+                problems.append(f"{society_id}: /api/payments returned payments of another society")
+    return problems
+
+
+def summarize(endpoints: dict) -> dict:
+    requests = sum(e["requests"] for e in endpoints.values())
+    return {
+        "requests": requests,
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "worst_p50_ms": max((e["p50_ms"] for e in endpoints.values()), default=0),
+        "worst_p99_ms": max((e["p99_ms"] for e in endpoints.values()), default=0),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-tenant load benchmark")
+    parser.add_argument("--mongo-url", default=None, help="use a real mongod instead of the in-memory stand-in")
+    parser.add_argument("--societies", type=int, default=20)
+    parser.add_argument("--flats", type=int, default=100, help="flats per society")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--residents", type=int, default=20, help="residents per society")
+    parser.add_argument("--clients-per-society", type=int, default=2)
+    parser.add_argument("--noisy-clients", type=int, default=0, help="extra clients for the first society")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    suite.install_gateway_stubs()
+    db = suite.connect(args.mongo_url)
+
+    seed_start = time.perf_counter()
+    await suite.reset(db)
+    password_hash = server.hash_password(suite.PASSWORD)
+    tenants = [
+        await suite.seed(db, args.flats, args.years, args.residents,
+                         society_id=f"society-{n:04d}", password_hash=password_hash)
+        for n in range(args.societies)
+    ]
+    seed_elapsed = time.perf_counter() - seed_start
+    print(f"seeded {args.societies} societies x {args.flats} flats in {seed_elapsed:.1f}s", file=sys.stderr)
+
+    await server.audit_log.start()
+    transport = httpx.ASGITransport(app=server.app)
+    total_clients = args.societies * args.clients_per_society + args.noisy_clients
+    limits = httpx.Limits(max_connections=total_clients)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=120) as client:
+        problems = await check_isolation(client, tenants)
+        runs = [
+            suite.drive(client, suite.build_mix(data),
+                        args.clients_per_society + (args.noisy_clients if n == 0 else 0), args.duration)
+            for n, data in enumerate(tenants)
+        ]
+        results = await asyncio.gather(*runs)
+
+    per_society = {
+        data["society_id"]: {**summarize(result["endpoints"]), "rps": result["rps"]}
+        for data, result in zip(tenants, results)
+    }
+    quiet = [summary["worst_p99_ms"] for society_id, summary in per_society.items()
+             if not (args.noisy_clients and society_id == tenants[0]["society_id"])]
+    report = {
+        "backend": "mongod" if args.mongo_url else "mongomock",
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "seed_s": round(seed_elapsed, 2),
+        "isolation_problems": problems,
+        "requests": sum(result["requests"] for result in results),
+        "rps": round(sum(result["rps"] for result in results), 2),
+        "p99_across_societies_ms": {
+            "min": min(quiet, default=0),
+            "median": sorted(quiet)[len(quiet) // 2] if quiet else 0,
+            "max": max(quiet, default=0),
+        },
+        "societies": per_society,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    await server.audit_log.stop()
+    server.client.close()
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
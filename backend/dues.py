@@ -0,0 +1,62 @@
+"""What each flat owes per month.
+
+A ``dues`` document holds one flat's ``amount`` for one month (its custom charge
+or the month's base charge when the document was created), the ``late_fee`` the
+scheduler adds once the due date has passed, and a ``status`` that turns
+``"paid"`` when a payment for that flat and month is recorded, however it is
+recorded. Everything that asks a resident for money prices it with
+``amount_due``, so a late fee is always charged once it has been applied.
+"""
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from ids import new_id
+
+
+def amount_due(flat: dict, charge: dict, due: Optional[dict] = None) -> float:
+    """The flat's dues amount plus any late fee; the current charge when it has no dues yet."""
+    if due:
+        return due['amount'] + (due.get('late_fee') or 0)
+    return flat.get('custom_charge') or charge['base_charge']
+
+
+async def create_dues(db, society_id: str, flats: List[dict], charge: dict):
+    """Create pending dues for ``flats`` for the charge's month, keeping any that exist."""
+    if not flats:
+        return
+    year, month = charge['year'], charge['month']
+    now = datetime.now(timezone.utc).isoformat()
+    await db.dues.bulk_write([
+        UpdateOne(
+            {"society_id": society_id, "flat_id": flat['id'], "month": month, "year": year},
+            {"$setOnInsert": {
+                "id": new_id(),
+                "flat_number": flat['flat_number'],
+                "amount": flat.get('custom_charge') or charge['base_charge'],
+                "late_fee": 0.0,
+                "status": "pending",
+                "created_at": now
+            }},
+            upsert=True
+        )
+        for flat in flats
+    ], ordered=False)
+    # Flats that paid before their dues existed.
+    paid = await db.payments.distinct(
+        "flat_id", {"society_id": society_id, "flat_id": {"$in": [flat['id'] for flat in flats]},
+                    "month": month, "year": year, "status": "paid"}
+    )
+    await settle_dues(db, society_id, [(flat_id, month, year) for flat_id in paid])
+
+
+async def settle_dues(db, society_id: str, keys: List[Tuple[str, int, int]]):
+    """Mark the dues of the given ``(flat_id, month, year)`` keys paid."""
+    if not keys:
+        return
+    await db.dues.bulk_write([
+        UpdateOne({"society_id": society_id, "flat_id": flat_id, "month": month, "year": year},
+                  {"$set": {"status": "paid"}})
+        for flat_id, month, year in set(keys)
+    ], ordered=False)
@@ -0,0 +1,55 @@
+"""Lazily loaded payment gateway integrations.
+
+The Stripe (emergentintegrations) and Razorpay SDKs are only imported the first
+time a request needs them, and only if the gateway is listed in
+``PAYMENT_GATEWAYS`` (comma separated, default ``stripe,razorpay``). A worker
+for a society that only uses one gateway never pays the import time or memory
+of the other.
+"""
+import os
+from functools import lru_cache
+
+from fastapi import HTTPException
+
+GATEWAY_NAMES = {"stripe": "Stripe", "razorpay": "Razorpay"}
+
+
+def enabled_gateways() -> set:
+    configured = os.environ.get('PAYMENT_GATEWAYS', 'stripe,razorpay')
+    return {name.strip().lower() for name in configured.split(',') if name.strip()}
+
+
+def require_gateway(name: str):
+    if name not in enabled_gateways():
+        raise HTTPException(status_code=404, detail=f"{GATEWAY_NAMES[name]} payments are not enabled")
+
+
+def razorpay_module():
+    """Return the ``razorpay`` package, importing it on first use."""
+    require_gateway("razorpay")
+    import razorpay
+    return razorpay
+
+
+@lru_cache(maxsize=1)
+def _razorpay_client():
+    razorpay = razorpay_module()
+    return razorpay.Client(auth=(os.environ.get('RAZORPAY_KEY_ID', ''), os.environ.get('RAZORPAY_KEY_SECRET', '')))
+
+
+def razorpay_client():
+    require_gateway("razorpay")
+    return _razorpay_client()
+
+
+def stripe_checkout(webhook_url: str = ""):
+    """Build a StripeCheckout for one request, importing emergentintegrations on first use."""
+    require_gateway("stripe")
+    from emergentintegrations.payments.stripe.checkout import StripeCheckout
+    return StripeCheckout(api_key=os.environ.get('STRIPE_API_KEY'), webhook_url=webhook_url)
+
+
+def stripe_session_request(**kwargs):
+    require_gateway("stripe")
+    from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
+    return CheckoutSessionRequest(**kwargs)
@@ -0,0 +1,99 @@
+"""Mongo connection-pool telemetry and a cached liveness ping.
+
+``PoolStats`` is a pymongo connection-pool listener that keeps running counts of
+open, checked-out and waiting connections, so reading them costs nothing.
+``MongoHealth`` pings the server at most once per ``ttl`` seconds no matter how
+often the probes are hit.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from pymongo import monitoring
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+        self.pools_cleared = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_check_out_started(self, event):
+        self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        self.waiting -= 1
+        self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        self.waiting -= 1
+        self.in_use += 1
+
+    def connection_checked_in(self, event):
+        self.in_use -= 1
+
+    def snapshot(self, max_pool_size: int) -> dict:
+        return {
+            "max_size": max_pool_size,
+            "open": self.open,
+            "in_use": self.in_use,
+            "available": max(self.open - self.in_use, 0),
+            "wait_queue": self.waiting,
+            "checkout_failures": self.checkout_failures,
+            "pools_cleared": self.pools_cleared,
+        }
+
+
+class MongoHealth:
+    def __init__(self, client, ttl: float = 2.0, timeout: float = 2.0):
+        self.client = client
+        self.ttl = ttl
+        self.timeout = timeout
+        self._checked_at = 0.0
+        self._result: Optional[dict] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def last_result(self) -> Optional[dict]:
+        return self._result
+
+    async def check(self) -> dict:
+        if self._result is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self._result
+        async with self._lock:
+            # Another request may have refreshed the result while we waited.
+            if self._result is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self._result
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.client.admin.command("ping"), self.timeout)
+                result = {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+            except Exception as e:
+                result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            result["checked_at"] = time.time()
+            self._result = result
+            self._checked_at = time.monotonic()
+            return result
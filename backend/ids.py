@@ -0,0 +1,67 @@
+"""Identifier generation for stored documents.
+
+New ids are UUIDv7 strings by default: the leading 48 bits are the Unix time in
+milliseconds, so ids created later sort after ids created earlier and inserts
+land on the right edge of the ``id`` index. Within a millisecond a 12-bit
+counter keeps ids from one worker strictly increasing.
+
+Set ``ID_STRATEGY=uuid4`` to fall back to random ids. Existing uuid4 ids remain
+valid strings of the same shape, so nothing stored needs rewriting.
+"""
+import os
+import secrets
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> str:
+    """Return a monotonic (per process) UUIDv7 string."""
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = secrets.randbits(11)
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Counter exhausted for this millisecond: borrow the next one.
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+
+    value = (ms & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= secrets.randbits(62)
+    return str(uuid.UUID(int=value))
+
+
+def uuid4() -> str:
+    return str(uuid.uuid4())
+
+
+STRATEGIES: Dict[str, Callable[[], str]] = {
+    "uuid7": uuid7,
+    "uuid4": uuid4,
+}
+
+_generator: Optional[Callable[[], str]] = None
+
+
+def new_id() -> str:
+    # Resolved on first use so ID_STRATEGY can come from the .env loaded by server.py.
+    global _generator
+    if _generator is None:
+        strategy = os.environ.get('ID_STRATEGY', 'uuid7').lower()
+        if strategy not in STRATEGIES:
+            raise RuntimeError(f"Unknown ID_STRATEGY '{strategy}', expected one of {sorted(STRATEGIES)}")
+        _generator = STRATEGIES[strategy]
+    return _generator()
@@ -0,0 +1,117 @@
+"""Index definitions, created at startup.
+
+``create_index`` is a no-op for an index that already exists, so this runs on
+every boot. A failing index (for example a unique index over legacy duplicate
+data) is logged and skipped rather than keeping the server from starting.
+Indexes listed in ``OBSOLETE_INDEXES`` are dropped first.
+"""
+import logging
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from search import search_keys
+
+logger = logging.getLogger(__name__)
+
+# Society-owned collections lead every index with ``society_id`` so a tenant's
+# queries only walk its own entries; unique indexes include it as well, which
+# keeps them valid once the collection is sharded on ``{society_id: 1, id: 1}``.
+INDEXES = {
+    "societies": [
+        ([("id", ASCENDING)], {"unique": True}),
+    ],
+    "users": [
+        ([("id", ASCENDING)], {"unique": True}),
+        # Login looks users up by email alone, so emails stay unique across societies.
+        ([("email", ASCENDING)], {"unique": True}),
+        ([("society_id", ASCENDING), ("role", ASCENDING), ("approved", ASCENDING)], {}),
+    ],
+    "flats": [
+        ([("society_id", ASCENDING), ("id", ASCENDING)], {"unique": True}),
+        ([("society_id", ASCENDING), ("flat_number", ASCENDING)], {"unique": True}),
+        ([("society_id", ASCENDING), ("search_keys", ASCENDING)], {}),
+    ],
+    "monthly_charges": [
+        ([("society_id", ASCENDING), ("year", DESCENDING), ("month", DESCENDING)], {"unique": True}),
+    ],
+    "payments": [
+        ([("society_id", ASCENDING), ("id", ASCENDING)], {"unique": True}),
+        ([("society_id", ASCENDING), ("flat_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)], {}),
+        ([("society_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING), ("status", ASCENDING)], {}),
+        ([("society_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("society_id", ASCENDING), ("payment_method", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("society_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("society_id", ASCENDING), ("amount", ASCENDING)], {}),
+        ([("society_id", ASCENDING), ("receipt_number", ASCENDING)], {}),
+    ],
+    "dues": [
+        ([("society_id", ASCENDING), ("id", ASCENDING)], {"unique": True}),
+        ([("society_id", ASCENDING), ("flat_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)], {"unique": True}),
+        ([("society_id", ASCENDING), ("year", ASCENDING), ("month", ASCENDING), ("status", ASCENDING)], {}),
+    ],
+    "payment_transactions": [
+        ([("society_id", ASCENDING), ("session_id", ASCENDING)], {"unique": True}),
+        # Set only while a transaction is pending; abandoned ones expire.
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "refresh_tokens": [
+        ([("user_id", ASCENDING)], {}),
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "revocations": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "reminder_log": [
+        # Set only while a send is claimed; a claim left by a crashed run expires.
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+}
+
+# Single-tenant indexes replaced by the ones above. The unique ones would stop a
+# second society from reusing a flat number or charging the same month.
+OBSOLETE_INDEXES = {
+    "users": ["role_1_approved_1"],
+    "flats": ["id_1", "flat_number_1", "search_keys_1"],
+    "monthly_charges": ["year_-1_month_-1"],
+    "payments": [
+        "id_1", "flat_id_1_year_1_month_1", "year_1_month_1_status_1", "created_at_-1",
+        "payment_method_1_created_at_-1", "status_1_created_at_-1", "amount_1", "receipt_number_1"
+    ],
+    "dues": ["flat_id_1_year_1_month_1", "year_1_month_1_status_1"],
+    "payment_transactions": ["session_id_1"],
+}
+
+
+async def ensure_indexes(db):
+    for collection, names in OBSOLETE_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name not in existing:
+                continue
+            try:
+                await db[collection].drop_index(name)
+                logger.info("Dropped obsolete index %s on %s", name, collection)
+            except Exception as e:
+                logger.error("Could not drop index %s on %s: %s", name, collection, e)
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except Exception as e:
+                logger.error("Could not create index %s on %s: %s", keys, collection, e)
+
+
+async def backfill_search_keys(db, batch_size: int = 1000):
+    """Add ``search_keys`` to flats created before flat search existed."""
+    cursor = db.flats.find(
+        {"search_keys": {"$exists": False}},
+        {"_id": 1, "flat_number": 1, "owner_name": 1, "owner_email": 1, "owner_phone": 1}
+    )
+    updates = []
+    async for flat in cursor:
+        updates.append(UpdateOne({"_id": flat['_id']}, {"$set": {"search_keys": search_keys(flat)}}))
+        if len(updates) >= batch_size:
+            await db.flats.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.flats.bulk_write(updates, ordered=False)
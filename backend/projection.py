@@ -0,0 +1,50 @@
+"""Client-selected response fields (``?fields=a,b,c``).
+
+The selected fields are validated against the endpoint's model and pushed down
+into the Mongo projection, so unrequested fields are neither read from BSON nor
+serialized. Nested documents are selected with a dotted prefix, for example
+``fields=current_due,flat.flat_number`` on the resident dashboard.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Split and validate a ``fields`` parameter; ``None`` means all fields."""
+    if fields is None:
+        return None
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    if not selected:
+        raise HTTPException(status_code=400, detail="fields must name at least one field")
+    allowed = set(allowed)
+    unknown = [field for field in selected if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    return list(dict.fromkeys(selected))
+
+
+def nested_fields(model_fields: Iterable[str], prefix: str) -> List[str]:
+    return [f"{prefix}.{field}" for field in model_fields]
+
+
+def split_fields(selected: Optional[List[str]]) -> Dict[str, Optional[List[str]]]:
+    """Group dotted selections by top-level key.
+
+    ``["flat.flat_number", "current_due"]`` becomes
+    ``{"flat": ["flat_number"], "current_due": None}``; ``None`` means the whole value.
+    """
+    groups: Dict[str, Optional[List[str]]] = {}
+    for field in selected or []:
+        top, _, sub = field.partition('.')
+        if not sub:
+            groups[top] = None
+        elif top not in groups or groups[top] is not None:
+            groups.setdefault(top, []).append(sub)
+    return groups
+
+
+def mongo_projection(selected: Optional[List[str]], exclude: Iterable[str] = ()) -> dict:
+    if selected:
+        return {"_id": 0, **{field: 1 for field in selected}}
+    return {"_id": 0, **{field: 0 for field in exclude}}
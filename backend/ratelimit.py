@@ -0,0 +1,124 @@
+"""Token-bucket rate limiting for the authentication endpoints.
+
+A limit is written as ``"<burst>/<seconds>"``: up to ``burst`` attempts at once,
+refilled evenly over ``seconds``. ``"10/60"`` allows ten quick attempts and then
+one every six seconds.
+
+``MemoryBuckets`` keeps buckets in the worker process, at most ``max_keys`` of
+them: when full, the least recently updated bucket is evicted, so a flood of new
+keys cannot reset the buckets that are being drawn on. ``MongoBuckets`` keeps
+them in a TTL-indexed ``rate_limits`` collection so every worker and replica
+draws from the same bucket, and falls back to the in-process buckets if Mongo
+cannot be reached. Select with ``RATE_LIMIT_BACKEND=memory|mongo``.
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Tuple
+
+from fastapi import HTTPException, Request
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+class Limit:
+    def __init__(self, spec: str):
+        burst, seconds = spec.split('/')
+        self.capacity = float(burst)
+        self.period = float(seconds)
+        self.rate = self.capacity / self.period  # tokens per second
+
+    def retry_after(self, tokens: float) -> int:
+        return max(1, math.ceil((1 - tokens) / self.rate))
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> [tokens, updated, period], least recently updated first.
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: Limit) -> Tuple[bool, int]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._evict(now)
+            bucket = self._buckets[key] = [limit.capacity, now, limit.period]
+        else:
+            self._buckets.move_to_end(key)
+        tokens = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True, 0
+        bucket[0] = tokens
+        return False, limit.retry_after(tokens)
+
+    def _evict(self, now: float):
+        """Make room for one bucket, dropping the least recently updated ones first."""
+        while self._buckets:
+            _, updated, period = next(iter(self._buckets.values()))
+            # A bucket idle for its own full period has refilled and carries no state.
+            if len(self._buckets) < self.max_keys and now - updated < period:
+                break
+            self._buckets.popitem(last=False)
+
+
+class MongoBuckets:
+    def __init__(self, collection, fallback: MemoryBuckets):
+        self.collection = collection
+        self.fallback = fallback
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def take(self, key: str, limit: Limit) -> Tuple[bool, int]:
+        now = datetime.now(timezone.utc)
+        tokens_per_ms = limit.rate / 1000
+        # Refill and consume in one atomic update so concurrent workers never
+        # both spend the last token.
+        pipeline = [
+            {"$set": {"tokens": {"$min": [limit.capacity, {"$add": [
+                {"$ifNull": ["$tokens", limit.capacity]},
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, tokens_per_ms]}
+            ]}]}}},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                "updated_at": now,
+                "expires_at": now + timedelta(seconds=limit.period)
+            }}
+        ]
+        try:
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.warning("Rate limit store unavailable, using in-process buckets: %s", e)
+            return await self.fallback.take(key, limit)
+        if bucket['allowed']:
+            return True, 0
+        return False, limit.retry_after(bucket['tokens'])
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: Dict[str, Limit]):
+        self.backend = backend
+        self.limits = limits
+
+    async def check(self, scope: str, identity: str):
+        """Spend one token for ``identity`` under ``scope`` or raise 429."""
+        allowed, retry_after = await self.backend.take(f"{scope}:{identity}", self.limits[scope])
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many attempts. Please try again later.",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
@@ -0,0 +1,349 @@
+"""Dues reminders by email and SMS.
+
+``Reminders.send_month`` streams the flats of a society that have not paid for
+a month out of one aggregation (each flat joined to its paid payment for that
+month through the ``(society_id, flat_id, year, month)`` index), renders a
+message per channel from templates and hands them to pluggable transports:
+
+* at most ``concurrency`` sends are in flight at once;
+* each transport paces itself with a token bucket, written ``"<burst>/<seconds>"``
+  as in ``ratelimit.py``, so a provider's rate limit is never exceeded;
+* every message is first claimed in ``reminder_log`` with one batched insert per
+  batch of flats. A flat is reminded at most once per month and channel however
+  often the job runs; a failed send releases its claim so the next run retries
+  it, and a claim left by a crashed run expires through a TTL index.
+
+Templates use ``string.Template`` placeholders (``$owner_name``,
+``$flat_number``, ``$amount``, ``$month_name``, ``$year``). A document in
+``reminder_templates`` whose ``_id`` is the society id overrides the defaults.
+"""
+import abc
+import asyncio
+import calendar
+import logging
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from email.message import EmailMessage
+from string import Template
+from typing import AsyncIterator, Dict, List, Optional
+
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+
+from dues import amount_due
+from ratelimit import Limit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATES = {
+    "email_subject": "Maintenance due for $month_name $year - flat $flat_number",
+    "email_body": (
+        "Dear $owner_name,\n\n"
+        "Our records show the maintenance charge of $amount for flat $flat_number "
+        "for $month_name $year is still unpaid. Please pay it from your resident dashboard.\n\n"
+        "If you have already paid, please ignore this message.\n"
+    ),
+    "sms_body": "Reminder: maintenance of $amount for flat $flat_number ($month_name $year) is unpaid.",
+}
+
+CLAIM_TTL = timedelta(minutes=15)
+
+
+class Throttle:
+    """Waits as needed so calls never exceed the token-bucket ``limit``."""
+
+    def __init__(self, limit: Limit):
+        self.limit = limit
+        self._tokens = limit.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.limit.capacity, self._tokens + (now - self._updated) * self.limit.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.limit.rate)
+
+
+class Transport(abc.ABC):
+    """Delivers rendered messages on one channel (``email`` or ``sms``)."""
+
+    channel = ""
+
+    def __init__(self, rate: str):
+        self.throttle = Throttle(Limit(rate))
+
+    @abc.abstractmethod
+    async def send(self, to: str, subject: str, body: str):
+        """Deliver one message; raise if it was not accepted."""
+
+    async def close(self):
+        pass
+
+
+class SMTPTransport(Transport):
+    """Email over SMTP. ``smtplib`` runs in worker threads, one reused connection per thread."""
+
+    channel = "email"
+
+    def __init__(self, host: str, port: int, sender: str, rate: str = "20/1", username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = False, timeout: float = 30):
+        super().__init__(rate)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[smtplib.SMTP] = []
+        self._connections_lock = threading.Lock()
+
+    async def send(self, to: str, subject: str, body: str):
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = to
+        message["Subject"] = subject
+        message.set_content(body)
+        await asyncio.to_thread(self._send, message)
+
+    def _send(self, message: EmailMessage):
+        try:
+            self._connection().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server closed an idle connection; reconnect once.
+            self._local.connection = None
+            self._connection().send_message(message)
+
+    def _connection(self) -> smtplib.SMTP:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password or "")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    async def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                await asyncio.to_thread(connection.quit)
+            except smtplib.SMTPException:
+                pass
+        self._local = threading.local()
+
+
+class WebhookSMSTransport(Transport):
+    """SMS through an HTTP gateway that accepts ``{"to": ..., "body": ...}`` JSON."""
+
+    channel = "sms"
+
+    def __init__(self, url: str, rate: str = "5/1", token: Optional[str] = None):
+        super().__init__(rate)
+        self.url = url
+        self.token = token
+        self._client = None
+
+    async def send(self, to: str, subject: str, body: str):
+        if self._client is None:
+            import httpx
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            self._client = httpx.AsyncClient(headers=headers, timeout=30)
+        response = await self._client.post(self.url, json={"to": to, "body": body})
+        response.raise_for_status()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LogTransport(Transport):
+    """Writes messages to the log instead of sending them; for development."""
+
+    def __init__(self, channel: str = "email", rate: str = "1000/1"):
+        super().__init__(rate)
+        self.channel = channel
+
+    async def send(self, to: str, subject: str, body: str):
+        logger.info("Reminder (%s) to %s: %s", self.channel, to, subject or body)
+
+
+def transports_from_env() -> List[Transport]:
+    transports = []
+    if os.environ.get('REMINDER_SMTP_HOST'):
+        transports.append(SMTPTransport(
+            os.environ['REMINDER_SMTP_HOST'],
+            int(os.environ.get('REMINDER_SMTP_PORT', 587)),
+            sender=os.environ.get('REMINDER_EMAIL_FROM', 'no-reply@localhost'),
+            rate=os.environ.get('REMINDER_EMAIL_RATE', '20/1'),
+            username=os.environ.get('REMINDER_SMTP_USERNAME'),
+            password=os.environ.get('REMINDER_SMTP_PASSWORD'),
+            starttls=os.environ.get('REMINDER_SMTP_STARTTLS', '1') == '1'
+        ))
+    if os.environ.get('REMINDER_SMS_WEBHOOK_URL'):
+        transports.append(WebhookSMSTransport(
+            os.environ['REMINDER_SMS_WEBHOOK_URL'],
+            rate=os.environ.get('REMINDER_SMS_RATE', '5/1'),
+            token=os.environ.get('REMINDER_SMS_WEBHOOK_TOKEN')
+        ))
+    if not transports and os.environ.get('REMINDER_LOG_ONLY') == '1':
+        transports.append(LogTransport("email"))
+    return transports
+
+
+def unpaid_flats_pipeline(society_id: str, year: int, month: int) -> list:
+    return [
+        {"$match": {"society_id": society_id}},
+        {"$lookup": {
+            "from": "payments",
+            "localField": "id",
+            "foreignField": "flat_id",
+            "pipeline": [
+                {"$match": {"society_id": society_id, "year": year, "month": month, "status": "paid"}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "paid"
+        }},
+        {"$match": {"paid": {"$size": 0}}},
+        {"$project": {"_id": 0, "id": 1, "flat_number": 1, "owner_name": 1, "owner_email": 1,
+                      "owner_phone": 1, "custom_charge": 1}}
+    ]
+
+
+class Reminders:
+    def __init__(self, db, transports: List[Transport], concurrency: int = 50, batch_size: int = 500):
+        self.db = db
+        self.transports = transports
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    async def unpaid_flats(self, society_id: str, year: int, month: int) -> AsyncIterator[List[dict]]:
+        batch = []
+        async for flat in self.db.flats.aggregate(unpaid_flats_pipeline(society_id, year, month),
+                                                  batchSize=self.batch_size):
+            batch.append(flat)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def templates(self, society_id: str) -> Dict[str, Template]:
+        custom = await self.db.reminder_templates.find_one({"_id": society_id}) or {}
+        return {name: Template(custom.get(name) or default) for name, default in DEFAULT_TEMPLATES.items()}
+
+    async def send_month(self, society_id: str, year: int, month: int, on_batch=None) -> dict:
+        """Remind every flat of the society that has not paid for the month; return counts."""
+        counts = {"sent": 0, "already_sent": 0, "failed": 0, "no_contact": 0}
+        if not self.transports:
+            return counts
+        charge = await self.db.monthly_charges.find_one(
+            {"society_id": society_id, "year": year, "month": month}, {"_id": 0, "base_charge": 1}
+        )
+        if not charge:
+            logger.warning("No charges for %s %d-%02d; no reminders sent", society_id, year, month)
+            return counts
+
+        templates = await self.templates(society_id)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async for flats in self.unpaid_flats(society_id, year, month):
+            dues = {
+                due['flat_id']: due for due in await self.db.dues.find(
+                    {"society_id": society_id, "flat_id": {"$in": [flat['id'] for flat in flats]},
+                     "year": year, "month": month},
+                    {"_id": 0, "flat_id": 1, "amount": 1, "late_fee": 1}
+                ).to_list(None)
+            }
+            messages = []
+            for flat in flats:
+                values = {
+                    "owner_name": flat.get('owner_name', ''),
+                    "flat_number": flat.get('flat_number', ''),
+                    "amount": f"{amount_due(flat, charge, dues.get(flat['id'])):.2f}",
+                    "month_name": calendar.month_name[month],
+                    "year": year
+                }
+                for transport in self.transports:
+                    to = flat.get('owner_email' if transport.channel == 'email' else 'owner_phone')
+                    if not to:
+                        counts["no_contact"] += 1
+                        continue
+                    messages.append({
+                        "_id": f"{society_id}:{flat['id']}:{year}-{month:02d}:{transport.channel}",
+                        "transport": transport,
+                        "to": to,
+                        "subject": templates["email_subject"].safe_substitute(values) if transport.channel == 'email' else "",
+                        "body": templates[f"{transport.channel}_body"].safe_substitute(values),
+                        "flat_id": flat['id']
+                    })
+
+            claimed = await self._claim(society_id, year, month, messages)
+            counts["already_sent"] += len(messages) - len(claimed)
+
+            async def deliver(message):
+                async with semaphore:
+                    await message["transport"].throttle.wait()
+                    try:
+                        await message["transport"].send(message["to"], message["subject"], message["body"])
+                        return True
+                    except Exception as e:
+                        logger.warning("Reminder %s to %s failed: %s", message["_id"], message["to"], e)
+                        return False
+
+            results = await asyncio.gather(*[deliver(message) for message in claimed])
+            now = datetime.now(timezone.utc)
+            acks = [
+                UpdateOne({"_id": message["_id"]}, {"$set": {"status": "sent", "sent_at": now}, "$unset": {"expires_at": ""}})
+                if ok else DeleteOne({"_id": message["_id"]})
+                for message, ok in zip(claimed, results)
+            ]
+            if acks:
+                await self.db.reminder_log.bulk_write(acks, ordered=False)
+            counts["sent"] += sum(results)
+            counts["failed"] += len(results) - sum(results)
+            if on_batch:
+                await on_batch()
+
+        logger.info("Reminders for %s %d-%02d: %s", society_id, year, month, counts)
+        return counts
+
+    async def _claim(self, society_id: str, year: int, month: int, messages: List[dict]) -> List[dict]:
+        """Insert a log entry per message; return the messages no earlier run has claimed."""
+        if not messages:
+            return []
+        now = datetime.now(timezone.utc)
+        docs = [{
+            "_id": message["_id"], "society_id": society_id, "flat_id": message["flat_id"], "year": year,
+            "month": month, "channel": message["transport"].channel, "to": message["to"],
+            "status": "sending", "created_at": now, "expires_at": now + CLAIM_TTL
+        } for message in messages]
+        try:
+            await self.db.reminder_log.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(err['code'] != 11000 for err in errors):
+                raise
+            taken = {err['index'] for err in errors}
+            return [message for index, message in enumerate(messages) if index not in taken]
+        return messages
+
+    async def close(self):
+        for transport in self.transports:
+            await transport.close()
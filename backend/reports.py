@@ -0,0 +1,146 @@
+"""Expense analytics over ``MonthlyCharge.breakdown``.
+
+Charges are per flat and are never edited once created, so the per-category
+totals of a month that has ended can never change. Those monthly rollups are
+memoized in the worker and persisted in the ``report_cache`` collection; only
+the current month and months not seen before are aggregated from
+``monthly_charges``. A multi-year report therefore costs one cache lookup plus
+one small aggregation, however much history exists. Rollups are kept per
+society.
+
+A restore rewrites a society's charges, so it calls ``invalidate``: the
+persisted rollups are deleted and the society's generation in ``report_cache``
+is bumped. Other workers compare it at most every ``state_ttl`` seconds and drop
+their memoized rollups when it has changed.
+"""
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+Month = Tuple[int, int]
+SocietyMonth = Tuple[str, int, int]
+
+
+class ExpenseReports:
+    def __init__(self, charges, cache, max_time_ms: int, state_ttl: float = 60.0):
+        self.charges = charges
+        self.cache = cache
+        self.max_time_ms = max_time_ms
+        self.state_ttl = state_ttl
+        self._closed: Dict[SocietyMonth, dict] = {}
+        self._generations: Dict[str, Tuple[int, float]] = {}
+
+    async def invalidate(self, society_id: str):
+        """Forget every rollup of the society, in this worker, the cache and (within ``state_ttl``) other workers."""
+        await self.cache.delete_many({"society_id": society_id})
+        await self.cache.update_one({"_id": _generation_key(society_id)}, {"$inc": {"generation": 1}}, upsert=True)
+        self._forget(society_id)
+
+    def _forget(self, society_id: str):
+        self._generations.pop(society_id, None)
+        for key in [key for key in self._closed if key[0] == society_id]:
+            del self._closed[key]
+
+    async def _check_generation(self, society_id: str):
+        known = self._generations.get(society_id)
+        if known and time.monotonic() - known[1] < self.state_ttl:
+            return
+        doc = await self.cache.find_one({"_id": _generation_key(society_id)})
+        generation = doc['generation'] if doc else 0
+        if known and known[0] != generation:
+            self._forget(society_id)
+        self._generations[society_id] = (generation, time.monotonic())
+
+    async def monthly_rollups(self, society_id: str, months: List[Month], now: datetime) -> Dict[Month, dict]:
+        await self._check_generation(society_id)
+        current = (now.year, now.month)
+        rollups = {m: self._closed[(society_id, *m)] for m in months if (society_id, *m) in self._closed}
+
+        missing = [m for m in months if m not in rollups and m < current]
+        if missing:
+            cached = await self.cache.find(
+                {"_id": {"$in": [_cache_key(society_id, m) for m in missing]}}
+            ).to_list(len(missing))
+            for doc in cached:
+                month = (doc['year'], doc['month'])
+                self._closed[(society_id, *month)] = rollups[month] = doc['rollup']
+
+        to_compute = [m for m in months if m not in rollups]
+        if to_compute:
+            computed = await self._aggregate(society_id, to_compute)
+            for month, rollup in computed.items():
+                rollups[month] = rollup
+                if month < current:
+                    self._closed[(society_id, *month)] = rollup
+                    await self.cache.update_one(
+                        {"_id": _cache_key(society_id, month)},
+                        {"$set": {"society_id": society_id, "year": month[0], "month": month[1], "rollup": rollup}},
+                        upsert=True
+                    )
+        return rollups
+
+    async def _aggregate(self, society_id: str, months: List[Month]) -> Dict[Month, dict]:
+        pipeline = [
+            {"$match": {"society_id": society_id, "$or": [{"year": y, "month": m} for y, m in months]}},
+            {"$project": {"year": 1, "month": 1, "base_charge": 1, "items": {"$objectToArray": "$breakdown"}}},
+            {"$unwind": {"path": "$items", "preserveNullAndEmptyArrays": True}},
+            {"$group": {
+                "_id": {"year": "$year", "month": "$month", "category": "$items.k"},
+                "amount": {"$sum": "$items.v"},
+                "base_charge": {"$first": "$base_charge"}
+            }}
+        ]
+        rollups: Dict[Month, dict] = {}
+        async for row in self.charges.aggregate(pipeline, maxTimeMS=self.max_time_ms):
+            month = (row['_id']['year'], row['_id']['month'])
+            rollup = rollups.setdefault(month, {"base_charge": row['base_charge'], "categories": {}})
+            if row['_id'].get('category') is not None:
+                rollup['categories'][row['_id']['category']] = row['amount']
+        return rollups
+
+    async def yearly_summary(self, society_id: str, years: List[int], now: datetime) -> List[dict]:
+        months = [(y, m) for y in sorted(set(years)) for m in range(1, 13) if (y, m) <= (now.year, now.month)]
+        rollups = await self.monthly_rollups(society_id, months, now)
+
+        summaries = []
+        previous = None
+        for year in sorted(set(years)):
+            year_rollups = [rollups[(year, m)] for m in range(1, 13) if (year, m) in rollups]
+            totals: Dict[str, float] = {}
+            for rollup in year_rollups:
+                for category, amount in rollup['categories'].items():
+                    totals[category] = totals.get(category, 0) + amount
+            per_flat_total = sum(rollup['base_charge'] for rollup in year_rollups)
+            breakdown_total = sum(totals.values())
+
+            categories = {}
+            for category, amount in sorted(totals.items()):
+                entry = {
+                    "per_flat": round(amount, 2),
+                    "monthly_average": round(amount / len(year_rollups), 2),
+                    "share": round(amount / breakdown_total, 4) if breakdown_total else 0,
+                    "change_vs_previous_year": None
+                }
+                # Compare monthly averages so a partial current year is not read as a drop.
+                if previous and previous['year'] == year - 1 and previous['categories'].get(category):
+                    before = previous['categories'][category]['monthly_average']
+                    entry["change_vs_previous_year"] = round((entry['monthly_average'] - before) / before, 4)
+                categories[category] = entry
+
+            summary = {
+                "year": year,
+                "months_with_charges": len(year_rollups),
+                "per_flat_total": round(per_flat_total, 2),
+                "categories": categories
+            }
+            summaries.append(summary)
+            previous = summary
+        return summaries
+
+
+def _cache_key(society_id: str, month: Month) -> str:
+    return f"expenses-{society_id}-{month[0]}-{month[1]:02d}"
+
+
+def _generation_key(society_id: str) -> str:
+    return f"expenses-{society_id}-generation"
@@ -0,0 +1,111 @@
+"""Access-token revocation without a database read per request.
+
+Access tokens are short-lived JWTs, so a revocation only has to outlive the
+tokens it cancels. Revocations are stored in the ``revocations`` collection,
+either for one token (``jti``) or for every token of a user issued before a
+given epoch, and expire through a TTL index once those tokens would have
+expired anyway. The collection therefore stays tiny.
+
+Each worker keeps the whole set in memory. It follows a change stream when the
+deployment supports one (replica sets, sharded clusters) and otherwise reloads
+the set every ``poll_interval`` seconds, so a revocation made on one worker
+reaches every other within seconds. ``is_revoked`` never touches the database.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional, Set
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    def __init__(self, collection, retain: timedelta, poll_interval: float = 2.0, watch: bool = True):
+        self.collection = collection
+        self.retain = retain
+        self.poll_interval = poll_interval
+        self.watch = watch
+        self._users: Dict[str, int] = {}
+        self._tokens: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, payload: dict) -> bool:
+        if payload.get('jti') in self._tokens:
+            return True
+        # Tokens issued before revocations existed have no iat and count as oldest.
+        not_before = self._users.get(payload.get('user_id'))
+        return not_before is not None and payload.get('iat', 0) < not_before
+
+    async def revoke_user(self, user_id: str):
+        """Cancel every token issued to the user so far."""
+        # Rounded up, so a token issued earlier in the same second is covered too.
+        not_before = int(time.time()) + 1
+        await self._store(f"user:{user_id}", {"user_id": user_id, "not_before": not_before})
+        self._users[user_id] = max(self._users.get(user_id, 0), not_before)
+
+    async def revoke_token(self, jti: str):
+        await self._store(f"token:{jti}", {"jti": jti})
+        self._tokens.add(jti)
+
+    async def _store(self, key: str, fields: dict):
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {**fields, "expires_at": datetime.now(timezone.utc) + self.retain}},
+            upsert=True
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def reload(self):
+        users, tokens = {}, set()
+        async for doc in self.collection.find({}):
+            self._apply(doc, users, tokens)
+        self._users, self._tokens = users, tokens
+
+    def _apply(self, doc: dict, users: Dict[str, int], tokens: Set[str]):
+        if 'jti' in doc:
+            tokens.add(doc['jti'])
+        elif 'user_id' in doc:
+            users[doc['user_id']] = max(users.get(doc['user_id'], 0), doc['not_before'])
+
+    async def _run(self):
+        while True:
+            try:
+                if self.watch:
+                    await self._follow()
+                else:
+                    await self.reload()
+                    await asyncio.sleep(self.poll_interval)
+            except OperationFailure as e:
+                # Standalone servers have no change streams; poll instead.
+                logger.info("Revocation change stream unavailable (%s); polling every %ss", e, self.poll_interval)
+                self.watch = False
+            except Exception:
+                logger.exception("Revocation refresh failed; retrying")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _follow(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        async with self.collection.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+            # Loaded after the stream opened, so nothing written in between is missed.
+            await self.reload()
+            # Reopen once in a while so entries that have expired are dropped from memory.
+            deadline = time.monotonic() + self.retain.total_seconds()
+            while time.monotonic() < deadline:
+                change = await stream.try_next()
+                if change and change.get('fullDocument'):
+                    self._apply(change['fullDocument'], self._users, self._tokens)
@@ -0,0 +1,307 @@
+"""Monthly charge rollover, dues generation and late fees.
+
+An in-process asyncio loop wakes every ``interval`` seconds and runs, for the
+current month and for each society:
+
+* ``charge_rollover``: on or after ``rollover_day``, create this month's
+  ``MonthlyCharge`` by copying the most recent one (or the ``charge_templates``
+  document whose ``_id`` is the society id, else ``"default"``, when no charge
+  exists yet).
+* ``generate_dues``: on or after ``rollover_day``, upsert one ``dues`` document
+  per flat with the amount owed (see ``dues.py``). Flats added later in the month
+  get theirs when they are created, and dues turn paid when a payment is recorded.
+* ``apply_late_fees``: on or after ``late_fee_day``, add the late fee to dues
+  still pending.
+* ``send_reminders``: on or after ``reminder_day`` (when set), remind flats that
+  have not paid (see ``reminders.py``). A run with failed sends stays
+  incomplete, so the next tick retries them.
+* ``archive_payments``: when ``archive_keep_years`` is set, move payments of
+  financial years older than that many closed years to the archive collection.
+
+Every worker and replica runs the loop, but each job first takes a lease
+document in ``job_leases``, so only one of them does the work. Jobs walk flats in
+``id`` order in batches and store the last processed id in ``job_runs``; a job
+interrupted by a crash or a lost lease resumes after that id instead of starting
+over, and a finished job is not run again for the same month.
+
+Reminders an admin asks for go through the same machinery: ``request_reminders``
+records a ``reminders-run-<job id>`` job in ``job_runs`` and starts it in the
+background under a lease. Its counts are stored on the job for polling, and a
+run that failed or whose worker died is picked up again by the next tick.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from archive import archive_cutoff
+from dues import create_dues, settle_dues
+from ids import new_id
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class Lease:
+    """A time-limited lock on one job, held in the ``job_leases`` collection."""
+
+    def __init__(self, collection, name: str, owner: str, ttl: float):
+        self.collection = collection
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Someone else holds an unexpired lease, so the upsert collided with it.
+            return False
+        return True
+
+    async def renew(self):
+        now = datetime.now(timezone.utc)
+        result = await self.collection.update_one(
+            {"_id": self.name, "owner": self.owner},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl)}}
+        )
+        if result.matched_count == 0:
+            raise LeaseLost(self.name)
+
+    async def release(self):
+        await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+
+
+async def charge_rollover(db, society_id: str, year: int, month: int) -> Optional[dict]:
+    """Create the society's MonthlyCharge for ``year``/``month`` if it does not exist yet."""
+    existing = await db.monthly_charges.find_one({"society_id": society_id, "month": month, "year": year}, {"_id": 0})
+    if existing:
+        return existing
+
+    source = await db.monthly_charges.find_one(
+        {"society_id": society_id, "$or": [{"year": {"$lt": year}}, {"year": year, "month": {"$lt": month}}]},
+        {"_id": 0},
+        sort=[("year", -1), ("month", -1)]
+    )
+    if not source:
+        source = (await db.charge_templates.find_one({"_id": society_id})
+                  or await db.charge_templates.find_one({"_id": "default"}))
+    if not source:
+        logger.warning("No previous charge or default template; charges for %s %d-%02d not created",
+                       society_id, year, month)
+        return None
+
+    charge = {
+        "id": new_id(),
+        "society_id": society_id,
+        "month": month,
+        "year": year,
+        "base_charge": source['base_charge'],
+        "breakdown": source.get('breakdown', {}),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "generated": True
+    }
+    try:
+        await db.monthly_charges.insert_one(charge)
+    except DuplicateKeyError:
+        # Created concurrently by an admin; theirs wins.
+        return await db.monthly_charges.find_one({"society_id": society_id, "month": month, "year": year}, {"_id": 0})
+    charge.pop('_id', None)
+    logger.info("Rolled over %s charges to %d-%02d (base %.2f)", society_id, year, month, charge['base_charge'])
+    return charge
+
+
+class Scheduler:
+    def __init__(self, db, interval: float = 3600, rollover_day: int = 1, late_fee_day: int = 15,
+                 late_fee: float = 0.0, late_fee_percent: float = 0.0, batch_size: int = 500,
+                 lease_ttl: float = 300, archive=None, fy_start_month: int = 4, archive_keep_years: int = 0,
+                 reminders=None, reminder_day: int = 0):
+        self.db = db
+        self.reminders = reminders
+        self.reminder_day = reminder_day
+        self.archive = archive
+        self.fy_start_month = fy_start_month
+        self.archive_keep_years = archive_keep_years
+        self.interval = interval
+        self.rollover_day = rollover_day
+        self.late_fee_day = late_fee_day
+        self.late_fee = late_fee
+        self.late_fee_percent = late_fee_percent
+        self.batch_size = batch_size
+        self.lease_ttl = lease_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{new_id()}"
+        self._task: Optional[asyncio.Task] = None
+        # Requested runs in progress in this process, by job name.
+        self._requested: Dict[str, asyncio.Task] = {}
+
+    async def request_reminders(self, society_id: str, year: int, month: int) -> str:
+        """Start an on-demand reminders run in the background; return its job id."""
+        job_id = new_id()
+        name = f"reminders-run-{job_id}"
+        await self.db.job_runs.insert_one({
+            "_id": name, "kind": "reminders", "job_id": job_id, "society_id": society_id,
+            "year": year, "month": month, "requested_at": datetime.now(timezone.utc), "checkpoint": None
+        })
+        self._start_requested(name, society_id, year, month)
+        return job_id
+
+    def _start_requested(self, name: str, society_id: str, year: int, month: int):
+        if name in self._requested:
+            return
+        task = asyncio.create_task(self._run_job(name, self._send_reminders, society_id, year, month))
+        self._requested[name] = task
+        task.add_done_callback(lambda _: self._requested.pop(name, None))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        for task in list(self._requested.values()):
+            task.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_due_jobs(datetime.now(timezone.utc))
+            except Exception:
+                logger.exception("Scheduled jobs failed; retrying next tick")
+            await asyncio.sleep(self.interval)
+
+    async def run_due_jobs(self, now: datetime):
+        # Requested reminder runs that failed or were left by a worker that died.
+        async for run in self.db.job_runs.find({"kind": "reminders", "completed_at": {"$exists": False}}):
+            self._start_requested(run['_id'], run['society_id'], run['year'], run['month'])
+        if self.archive is not None and self.archive_keep_years > 0:
+            cutoff = archive_cutoff(now, self.fy_start_month, self.archive_keep_years)
+            await self._run_job(f"archive-payments-{cutoff[0]}-{cutoff[1]:02d}", self._archive_payments, *cutoff)
+        if now.day < self.rollover_day:
+            return
+        for society in await self.db.societies.find({}, {"_id": 0, "id": 1}).to_list(None):
+            await self._run_society_jobs(society['id'], now)
+
+    async def _run_society_jobs(self, society_id: str, now: datetime):
+        year, month = now.year, now.month
+        # Each job only runs once the one before it has completed for this month.
+        if not await self._run_job(f"rollover-{society_id}-{year}-{month:02d}", self._rollover, society_id, year, month):
+            return
+        if not await self._run_job(f"dues-{society_id}-{year}-{month:02d}", self._generate_dues, society_id, year, month):
+            return
+        if now.day >= self.late_fee_day and (self.late_fee or self.late_fee_percent):
+            await self._run_job(f"late-fees-{society_id}-{year}-{month:02d}", self._apply_late_fees,
+                                society_id, year, month)
+        if self.reminders is not None and self.reminder_day and now.day >= self.reminder_day:
+            await self._run_job(f"reminders-{society_id}-{year}-{month:02d}", self._send_reminders,
+                                society_id, year, month)
+
+    async def _run_job(self, name: str, job, *args) -> bool:
+        """Run ``job`` unless it already completed or another worker holds it; return whether it is complete."""
+        run = await self.db.job_runs.find_one({"_id": name})
+        if run and run.get('completed_at'):
+            return True
+        lease = Lease(self.db.job_leases, name, self.owner, self.lease_ttl)
+        if not await lease.acquire():
+            return False
+        try:
+            await self.db.job_runs.update_one(
+                {"_id": name},
+                {"$set": {"started_at": datetime.now(timezone.utc), "owner": self.owner},
+                 "$setOnInsert": {"checkpoint": None}},
+                upsert=True
+            )
+            await job(name, lease, *args)
+            await self.db.job_runs.update_one(
+                {"_id": name}, {"$set": {"completed_at": datetime.now(timezone.utc)}}
+            )
+            logger.info("Job %s completed", name)
+            return True
+        except LeaseLost:
+            logger.warning("Lost lease on %s; another worker will resume it", name)
+        except Exception:
+            logger.exception("Job %s failed; it will resume from its checkpoint next tick", name)
+        finally:
+            await lease.release()
+        return False
+
+    async def _flat_batches(self, name: str, lease: Lease, query: Optional[dict] = None):
+        """Yield batches of flats after the job's checkpoint, renewing the lease between batches."""
+        run = await self.db.job_runs.find_one({"_id": name})
+        checkpoint = run.get('checkpoint') if run else None
+        while True:
+            batch_query = dict(query or {})
+            if checkpoint:
+                batch_query["id"] = {"$gt": checkpoint}
+            flats = await self.db.flats.find(
+                batch_query, {"_id": 0, "id": 1, "flat_number": 1, "custom_charge": 1}
+            ).sort("id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not flats:
+                return
+            yield flats
+            checkpoint = flats[-1]['id']
+            await self.db.job_runs.update_one({"_id": name}, {"$set": {"checkpoint": checkpoint}})
+            await lease.renew()
+
+    async def _rollover(self, name: str, lease: Lease, society_id: str, year: int, month: int):
+        if not await charge_rollover(self.db, society_id, year, month):
+            raise RuntimeError(f"No charges for {society_id} {year}-{month:02d} and nothing to roll over from")
+
+    async def _archive_payments(self, name: str, lease: Lease, year: int, month: int):
+        await self.archive.ensure_collection()
+        moved = await self.archive.archive_before((year, month), self.batch_size, on_batch=lease.renew)
+        logger.info("Archived %d payments dated before %d-%02d", moved, year, month)
+
+    async def _send_reminders(self, name: str, lease: Lease, society_id: str, year: int, month: int):
+        # The reminder log makes a resumed run skip flats already reminded.
+        counts = await self.reminders.send_month(society_id, year, month, on_batch=lease.renew)
+        await self.db.job_runs.update_one({"_id": name}, {"$set": {"counts": counts}})
+        if counts["failed"]:
+            # Failed sends released their claims; leave the job incomplete so the next tick retries them.
+            raise RuntimeError(f"{counts['failed']} reminders for {society_id} {year}-{month:02d} failed")
+
+    async def _generate_dues(self, name: str, lease: Lease, society_id: str, year: int, month: int):
+        charge = await self.db.monthly_charges.find_one({"society_id": society_id, "month": month, "year": year}, {"_id": 0})
+        if not charge:
+            raise RuntimeError(f"No charges for {society_id} {year}-{month:02d}; cannot generate dues")
+        async for flats in self._flat_batches(name, lease, {"society_id": society_id}):
+            await create_dues(self.db, society_id, flats, charge)
+
+    async def _apply_late_fees(self, name: str, lease: Lease, society_id: str, year: int, month: int):
+        async for flats in self._flat_batches(name, lease, {"society_id": society_id}):
+            flat_ids = [flat['id'] for flat in flats]
+            paid = await self.db.payments.distinct(
+                "flat_id", {"society_id": society_id, "flat_id": {"$in": flat_ids},
+                            "month": month, "year": year, "status": "paid"}
+            )
+            # Normally settled when the payment was recorded; catches payments written directly.
+            await settle_dues(self.db, society_id, [(flat_id, month, year) for flat_id in paid])
+            unpaid = list(set(flat_ids) - set(paid))
+            if not unpaid:
+                continue
+            # Only dues without a fee yet, so a resumed batch never charges twice.
+            fee_filter = {"society_id": society_id, "flat_id": {"$in": unpaid}, "month": month, "year": year,
+                          "status": "pending", "late_fee": 0}
+            if self.late_fee_percent:
+                await self.db.dues.update_many(fee_filter, [{"$set": {"late_fee": {"$add": [
+                    self.late_fee, {"$multiply": ["$amount", self.late_fee_percent / 100]}
+                ]}}}])
+            else:
+                await self.db.dues.update_many(fee_filter, {"$set": {"late_fee": self.late_fee}})
@@ -0,0 +1,90 @@
+"""Query builders for flat search and payment filtering.
+
+Flats carry a ``search_keys`` array of lower-cased search terms (flat number,
+owner name and each of its words, email, phone digits). A multikey index on it
+turns a case-insensitive prefix search over all four fields into one anchored
+regex scan of the index. Payment filters map onto the compound indexes created
+in ``indexes.py``.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def search_keys(flat: dict) -> List[str]:
+    keys = set()
+    if flat.get('flat_number'):
+        number = flat['flat_number'].lower()
+        keys.add(number)
+        keys.add(re.sub(r'[^a-z0-9]', '', number))
+    if flat.get('owner_name'):
+        name = flat['owner_name'].lower().strip()
+        keys.add(name)
+        keys.update(name.split())
+    if flat.get('owner_email'):
+        keys.add(flat['owner_email'].lower())
+    if flat.get('owner_phone'):
+        digits = re.sub(r'\D', '', flat['owner_phone'])
+        keys.add(digits)
+        keys.add(digits[-10:])
+    keys.discard('')
+    return sorted(keys)
+
+
+def flat_search_query(q: str) -> dict:
+    term = q.strip().lower()
+    if not term:
+        return {}
+    return {"search_keys": {"$regex": f"^{re.escape(term)}"}}
+
+
+def parse_period(value: str) -> Tuple[int, int]:
+    """Parse a ``YYYY-MM`` string into ``(year, month)``."""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid month '{value}', expected YYYY-MM")
+    if not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail=f"Invalid month '{value}', expected YYYY-MM")
+    return year, month
+
+
+def month_range_query(from_month: Optional[str], to_month: Optional[str]) -> dict:
+    """Match documents whose (year, month) lies within the inclusive range."""
+    clauses = []
+    if from_month:
+        year, month = parse_period(from_month)
+        clauses.append({"$or": [{"year": {"$gt": year}}, {"year": year, "month": {"$gte": month}}]})
+    if to_month:
+        year, month = parse_period(to_month)
+        clauses.append({"$or": [{"year": {"$lt": year}}, {"year": year, "month": {"$lte": month}}]})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def payment_filter_query(
+    flat_id: Optional[str] = None,
+    from_month: Optional[str] = None,
+    to_month: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    status: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None
+) -> dict:
+    query = {}
+    if flat_id:
+        query["flat_id"] = flat_id
+    if payment_method:
+        query["payment_method"] = payment_method
+    if status:
+        query["status"] = status
+    if min_amount is not None or max_amount is not None:
+        query["amount"] = {}
+        if min_amount is not None:
+            query["amount"]["$gte"] = min_amount
+        if max_amount is not None:
+            query["amount"]["$lte"] = max_amount
+    query.update(month_range_query(from_month, to_month))
+    return query
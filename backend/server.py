@@ -1,28 +1,102 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, InsertOne
+from pymongo.errors import BulkWriteError, ExecutionTimeout
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Dict
-import uuid
+from typing import Any, List, Optional, Dict
 from datetime import datetime, timezone, timedelta
 import bcrypt
+import hashlib
+import secrets
 import jwt
-import razorpay
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+from ids import new_id
+import gateways
+from health import PoolStats, MongoHealth
+from audit import AuditLog
+from indexes import ensure_indexes, backfill_search_keys
+from search import search_keys, flat_search_query, payment_filter_query, parse_period
+from projection import parse_fields, nested_fields, split_fields, mongo_projection
+from scheduler import Scheduler
+from dues import amount_due, create_dues, settle_dues
+from reports import ExpenseReports
+from archive import PaymentArchive, backfill_transaction_expiry
+from tenancy import DEFAULT_SOCIETY_ID, scoped, ensure_society, backfill_society_ids
+from revocation import RevocationList
+from reminders import Reminders, transports_from_env
+from backup import backup_stream, restore_stream, supports_snapshot
+from batch import BatchRunner, SHARED_USER_KEY
+from ratelimit import Limit, MemoryBuckets, MongoBuckets, RateLimiter, client_ip
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+pool_stats = PoolStats()
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000)),
+    waitQueueTimeoutMS=int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+    serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    connectTimeoutMS=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    event_listeners=[pool_stats]
+)
 db = client[os.environ['DB_NAME']]
 
-razorpay_client = razorpay.Client(auth=(os.environ.get('RAZORPAY_KEY_ID', ''), os.environ.get('RAZORPAY_KEY_SECRET', '')))
+# Dashboards and reports read through their own pool, from secondaries when the
+# deployment has them, with a server-side time cap, so heavy reads cannot starve
+# login and payment traffic on the primary pool.
+ANALYTICS_MAX_POOL_SIZE = int(os.environ.get('ANALYTICS_MAX_POOL_SIZE', 10))
+ANALYTICS_MAX_TIME_MS = int(os.environ.get('ANALYTICS_MAX_TIME_MS', 15000))
+analytics_pool_stats = PoolStats()
+analytics_client = AsyncIOMotorClient(
+    os.environ.get('ANALYTICS_MONGO_URL', mongo_url),
+    readPreference=os.environ.get('ANALYTICS_READ_PREFERENCE', 'secondaryPreferred'),
+    maxPoolSize=ANALYTICS_MAX_POOL_SIZE,
+    maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000)),
+    waitQueueTimeoutMS=int(os.environ.get('ANALYTICS_WAIT_QUEUE_TIMEOUT_MS', 10000)),
+    serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    event_listeners=[analytics_pool_stats]
+)
+analytics_db = analytics_client[os.environ['DB_NAME']]
+expense_reports = ExpenseReports(analytics_db.monthly_charges, db.report_cache, ANALYTICS_MAX_TIME_MS)
+mongo_health = MongoHealth(client, ttl=float(os.environ.get('HEALTH_CACHE_SECONDS', 2)))
+audit_log = AuditLog(
+    db.audit_log,
+    batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', 200)),
+    flush_interval=float(os.environ.get('AUDIT_FLUSH_SECONDS', 1)),
+    max_queue=int(os.environ.get('AUDIT_MAX_QUEUE', 10000))
+)
+payment_archive = PaymentArchive(db)
+reminders = Reminders(
+    db,
+    transports_from_env(),
+    concurrency=int(os.environ.get('REMINDER_CONCURRENCY', 50))
+)
+PENDING_TRANSACTION_TTL = timedelta(hours=float(os.environ.get('PENDING_TRANSACTION_TTL_HOURS', 48)))
+scheduler = Scheduler(
+    db,
+    interval=float(os.environ.get('SCHEDULER_INTERVAL_SECONDS', 3600)),
+    rollover_day=int(os.environ.get('CHARGE_ROLLOVER_DAY', 1)),
+    late_fee_day=int(os.environ.get('LATE_FEE_DAY', 15)),
+    late_fee=float(os.environ.get('LATE_FEE_AMOUNT', 0)),
+    late_fee_percent=float(os.environ.get('LATE_FEE_PERCENT', 0)),
+    archive=payment_archive,
+    fy_start_month=int(os.environ.get('FINANCIAL_YEAR_START_MONTH', 4)),
+    archive_keep_years=int(os.environ.get('ARCHIVE_KEEP_YEARS', 0)),
+    reminders=reminders,
+    reminder_day=int(os.environ.get('REMINDER_DAY', 0))
+)
 
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -31,29 +105,115 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production'
 JWT_ALGORITHM = "HS256"
 security = HTTPBearer()
 
+# Access tokens are checked against an in-memory revocation set only, so they are
+# kept short; clients use the refresh token (stored in Mongo) to get a new one.
+ACCESS_TOKEN_TTL = timedelta(minutes=float(os.environ.get('ACCESS_TOKEN_TTL_MINUTES', 15)))
+REFRESH_TOKEN_TTL = timedelta(days=float(os.environ.get('REFRESH_TOKEN_TTL_DAYS', 30)))
+revocations = RevocationList(
+    db.revocations,
+    retain=ACCESS_TOKEN_TTL,
+    poll_interval=float(os.environ.get('REVOCATION_POLL_SECONDS', 2)),
+    watch=os.environ.get('REVOCATION_CHANGE_STREAM', '1') == '1'
+)
+
+# Checked before any bcrypt work so a credential-stuffing burst cannot pin the CPU.
+rate_limiter = RateLimiter(
+    MongoBuckets(db.rate_limits, MemoryBuckets()) if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == 'mongo' else MemoryBuckets(),
+    {
+        "login-ip": Limit(os.environ.get('LOGIN_RATE_LIMIT_IP', '20/60')),
+        "login-email": Limit(os.environ.get('LOGIN_RATE_LIMIT_EMAIL', '5/300')),
+        "register-ip": Limit(os.environ.get('REGISTER_RATE_LIMIT_IP', '5/3600')),
+    }
+)
+
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def create_token(user_id: str, email: str, role: str) -> str:
+def create_token(user_id: str, email: str, role: str, society_id: str) -> str:
+    now = datetime.now(timezone.utc)
     payload = {
         'user_id': user_id,
         'email': email,
         'role': role,
-        'exp': datetime.now(timezone.utc) + timedelta(days=7)
+        'society_id': society_id,
+        'jti': new_id(),
+        'iat': now,
+        'exp': now + ACCESS_TOKEN_TTL
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+async def create_refresh_token(user_id: str, society_id: str) -> str:
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    # Only the hash is stored, so a leaked collection cannot be replayed.
+    await db.refresh_tokens.insert_one({
+        "_id": hash_refresh_token(token),
+        "user_id": user_id,
+        "society_id": society_id,
+        "created_at": now,
+        "expires_at": now + REFRESH_TOKEN_TTL
+    })
+    return token
+
+async def revoke_user_sessions(user_id: str):
+    """End every session of the user within seconds, on every worker."""
+    await revocations.revoke_user(user_id)
+    await db.refresh_tokens.delete_many({"user_id": user_id})
+
+async def next_receipt_numbers(society_id: str, count: int) -> List[str]:
+    """Allocate ``count`` consecutive receipt numbers for today, e.g. REC-20250105-000042.
+
+    Each society has its own sequence, so tenants never contend on one counter.
+    """
+    day = datetime.now(timezone.utc).strftime('%Y%m%d')
+    counter = await db.counters.find_one_and_update(
+        {"_id": f"receipt-{society_id}-{day}"},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    first = counter['seq'] - count + 1
+    return [f"REC-{day}-{seq:06d}" for seq in range(first, counter['seq'] + 1)]
+
+async def next_receipt_number(society_id: str) -> str:
+    return (await next_receipt_numbers(society_id, 1))[0]
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Sub-requests of /api/batch reuse the payload already verified for the batch.
+    shared = request.scope.get(SHARED_USER_KEY)
+    if shared is not None:
+        return shared
     try:
         payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
+        # Tokens issued before tenancy belong to the default society.
+        payload.setdefault('society_id', DEFAULT_SOCIETY_ID)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if revocations.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+async def current_user_doc(current_user: dict) -> Optional[dict]:
+    """The caller's user document, without the password hash.
+
+    Read once per request; batched sub-requests share ``current_user`` and so
+    share one read, concurrent callers waiting on the same lookup.
+    """
+    lookup = current_user.get('_user_doc')
+    if lookup is None:
+        lookup = current_user['_user_doc'] = asyncio.ensure_future(db.users.find_one(
+            scoped(current_user, {"id": current_user['user_id']}), {"_id": 0, "password_hash": 0}
+        ))
+    user = await lookup
+    return dict(user) if user else None
 
 # Models
 class UserRegister(BaseModel):
@@ -63,14 +223,32 @@ class UserRegister(BaseModel):
     role: str
     flat_number: Optional[str] = None
     phone: Optional[str] = None
+    society_id: Optional[str] = None
+    society_name: Optional[str] = None
 
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
+    society_id: str
     email: str
     name: str
     role: str
@@ -82,7 +260,8 @@ class User(BaseModel):
 
 class Flat(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
+    society_id: str
     flat_number: str
     owner_name: str
     owner_email: str
@@ -101,7 +280,8 @@ class FlatCreate(BaseModel):
 
 class MonthlyCharge(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
+    society_id: str
     month: int
     year: int
     base_charge: float
@@ -116,7 +296,8 @@ class MonthlyChargeCreate(BaseModel):
 
 class Payment(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
+    society_id: str
     flat_id: str
     flat_number: str
     month: int
@@ -137,16 +318,21 @@ class PaymentCreate(BaseModel):
 
 class PaymentTransaction(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=new_id)
+    society_id: str
     session_id: str
-    flat_id: str
-    month: int
-    year: int
+    # One due, or ``items`` (flat_id, flat_number, month, year, amount) for a multi-due checkout.
+    flat_id: Optional[str] = None
+    month: Optional[int] = None
+    year: Optional[int] = None
+    items: Optional[List[Dict]] = None
     amount: float
     currency: str
     payment_status: str
     metadata: Optional[Dict] = None
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    # Pending transactions are removed by a TTL index once this passes; unset when paid.
+    expires_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc) + PENDING_TRANSACTION_TTL)
 
 class CheckoutRequest(BaseModel):
     flat_id: str
@@ -154,21 +340,41 @@ class CheckoutRequest(BaseModel):
     year: int
     origin_url: str
 
+class DueItem(BaseModel):
+    flat_id: str
+    month: int
+    year: int
+
+class MultiCheckoutRequest(BaseModel):
+    items: List[DueItem]
+    origin_url: str
+
 # Auth Routes
 @api_router.post("/auth/register")
-async def register(user_data: UserRegister):
+async def register(user_data: UserRegister, request: Request):
+    await rate_limiter.check("register-ip", client_ip(request))
+    
     existing = await db.users.find_one({"email": user_data.email}, {"_id": 0})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
+    # An admin registering for a society that does not exist yet creates it;
+    # residents can only join an existing one.
+    society_id = user_data.society_id or DEFAULT_SOCIETY_ID
+    if user_data.role == 'admin':
+        await ensure_society(db, society_id, user_data.society_name)
+    elif not await db.societies.find_one({"id": society_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Society not found")
+    
     user_dict = user_data.model_dump()
+    user_dict['society_id'] = society_id
     hashed_pw = hash_password(user_dict.pop('password'))
     
-    # Check if this is the first admin
+    # Check if this is the first admin of the society
     is_first_admin = False
     approved = True
     if user_data.role == 'admin':
-        admin_count = await db.users.count_documents({"role": "admin"})
+        admin_count = await db.users.count_documents({"society_id": society_id, "role": "admin"})
         if admin_count == 0:
             is_first_admin = True
             approved = True
@@ -191,25 +397,62 @@ async def register(user_data: UserRegister):
             "pending_approval": True
         }
     
-    token = create_token(user_obj.id, user_obj.email, user_obj.role)
-    return {"token": token, "user": user_obj.model_dump()}
+    token = create_token(user_obj.id, user_obj.email, user_obj.role, user_obj.society_id)
+    refresh_token = await create_refresh_token(user_obj.id, user_obj.society_id)
+    return {"token": token, "refresh_token": refresh_token, "user": user_obj.model_dump()}
 
 @api_router.post("/auth/login")
-async def login(credentials: UserLogin):
+async def login(credentials: UserLogin, request: Request):
+    await rate_limiter.check("login-ip", client_ip(request))
+    await rate_limiter.check("login-email", credentials.email.lower())
+    
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    # A user recreated from a backup (before restores stopped doing that) has no password hash.
+    if not user or not user.get('password_hash') or not verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if user['role'] == 'admin' and not user.get('approved', True):
         raise HTTPException(status_code=403, detail="Your admin account is pending approval")
     
-    token = create_token(user['id'], user['email'], user['role'])
+    society_id = user.get('society_id', DEFAULT_SOCIETY_ID)
+    token = create_token(user['id'], user['email'], user['role'], society_id)
+    refresh_token = await create_refresh_token(user['id'], society_id)
     user.pop('password_hash', None)
-    return {"token": token, "user": user}
+    return {"token": token, "refresh_token": refresh_token, "user": user}
+
+@api_router.post("/auth/refresh")
+async def refresh(request_data: RefreshRequest):
+    # Single use: the presented token is consumed and a new one issued with the access token.
+    stored = await db.refresh_tokens.find_one_and_delete({
+        "_id": hash_refresh_token(request_data.refresh_token),
+        "expires_at": {"$gt": datetime.now(timezone.utc)}
+    })
+    if not stored:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    user = await db.users.find_one(
+        {"id": stored['user_id'], "society_id": stored['society_id']}, {"_id": 0, "password_hash": 0}
+    )
+    if not user or (user['role'] == 'admin' and not user.get('approved', True)):
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    token = create_token(user['id'], user['email'], user['role'], stored['society_id'])
+    refresh_token = await create_refresh_token(user['id'], stored['society_id'])
+    return {"token": token, "refresh_token": refresh_token}
+
+@api_router.post("/auth/logout")
+async def logout(request_data: LogoutRequest, current_user: dict = Depends(get_current_user)):
+    if current_user.get('jti'):
+        await revocations.revoke_token(current_user['jti'])
+    if request_data.refresh_token:
+        await db.refresh_tokens.delete_one({
+            "_id": hash_refresh_token(request_data.refresh_token), "user_id": current_user['user_id']
+        })
+    return {"message": "Logged out"}
 
 @api_router.get("/auth/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0, "password_hash": 0})
+    user = await current_user_doc(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -217,53 +460,103 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 # Admin Approval Routes
 @api_router.get("/admin/pending")
 async def get_pending_admins(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+    user = await current_user_doc(current_user)
     if not user or not user.get('is_super_admin', False):
         raise HTTPException(status_code=403, detail="Super admin access required")
     
     pending_admins = await db.users.find(
-        {"role": "admin", "approved": False}, 
+        scoped(current_user, {"role": "admin", "approved": False}),
         {"_id": 0, "password_hash": 0}
     ).to_list(1000)
     return pending_admins
 
 @api_router.post("/admin/approve/{user_id}")
 async def approve_admin(user_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+    user = await current_user_doc(current_user)
     if not user or not user.get('is_super_admin', False):
         raise HTTPException(status_code=403, detail="Super admin access required")
     
     result = await db.users.update_one(
-        {"id": user_id, "role": "admin"},
+        scoped(current_user, {"id": user_id, "role": "admin"}),
         {"$set": {"approved": True}}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Admin not found")
     
+    await audit_log.record(current_user, "admin.approve", "user", user_id)
     return {"message": "Admin approved successfully"}
 
 @api_router.post("/admin/reject/{user_id}")
 async def reject_admin(user_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+    user = await current_user_doc(current_user)
     if not user or not user.get('is_super_admin', False):
         raise HTTPException(status_code=403, detail="Super admin access required")
     
-    result = await db.users.delete_one({"id": user_id, "role": "admin", "approved": False})
+    result = await db.users.delete_one(scoped(current_user, {"id": user_id, "role": "admin", "approved": False}))
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Pending admin not found")
     
+    await revoke_user_sessions(user_id)
+    await audit_log.record(current_user, "admin.reject", "user", user_id)
     return {"message": "Admin rejected and removed"}
 
+@api_router.get("/admin/backup")
+async def backup_society(current_user: dict = Depends(get_current_user)):
+    user = await current_user_doc(current_user)
+    if not user or not user.get('is_super_admin', False):
+        raise HTTPException(status_code=403, detail="Super admin access required")
+    
+    society_id = current_user['society_id']
+    snapshot = await supports_snapshot(client)
+    await audit_log.record(current_user, "society.backup", "society", society_id, {"snapshot": snapshot})
+    filename = f"backup-{society_id}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.ndjson.gz"
+    return StreamingResponse(
+        backup_stream(client, db, society_id, snapshot),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Backup-Snapshot": str(snapshot).lower()}
+    )
+
+@api_router.post("/admin/restore")
+async def restore_society(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    replace: bool = Query(False, description="Also delete the society's documents that are not in the backup")
+):
+    user = await current_user_doc(current_user)
+    if not user or not user.get('is_super_admin', False):
+        raise HTTPException(status_code=403, detail="Super admin access required")
+    
+    # The body is read as it arrives; the archive is never held in memory.
+    result = await restore_stream(db, current_user['society_id'], request.stream(), replace=replace)
+    # Restored charges may differ from the ones the expense report rollups were built from.
+    await expense_reports.invalidate(current_user['society_id'])
+    await audit_log.record(current_user, "society.restore", "society", current_user['society_id'],
+                           {**result, "replace": replace})
+    if result['conflicts']:
+        # Everything else was restored; the listed documents clash with current data.
+        raise HTTPException(status_code=409, detail={"message": "Some documents conflict with current data", **result})
+    return result
+
 # Flats Routes
 @api_router.get("/flats", response_model=List[Flat])
-async def get_flats(current_user: dict = Depends(get_current_user)):
+async def get_flats(
+    current_user: dict = Depends(get_current_user),
+    q: Optional[str] = Query(None, description="Prefix of flat number, owner name, email or phone"),
+    fields: Optional[str] = Query(None, description="Comma-separated Flat fields to return"),
+    limit: int = Query(1000, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    selected = parse_fields(fields, Flat.model_fields)
+    query = scoped(current_user, flat_search_query(q) if q else {})
     if current_user['role'] == 'resident':
-        user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
-        flats = await db.flats.find({"flat_number": user.get('flat_number')}, {"_id": 0}).to_list(1000)
-    else:
-        flats = await db.flats.find({}, {"_id": 0}).to_list(1000)
+        user = await current_user_doc(current_user)
+        query["flat_number"] = user.get('flat_number')
+    flats = await db.flats.find(query, mongo_projection(selected, exclude=["search_keys"])).sort("flat_number", 1).skip(offset).limit(limit).to_list(limit)
+    if selected:
+        # Partial documents would fail Flat validation; send them as they are.
+        return JSONResponse(content=flats)
     return flats
 
 @api_router.post("/flats", response_model=Flat)
@@ -271,12 +564,20 @@ async def create_flat(flat_data: FlatCreate, current_user: dict = Depends(get_cu
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    existing = await db.flats.find_one({"flat_number": flat_data.flat_number}, {"_id": 0})
+    existing = await db.flats.find_one(scoped(current_user, {"flat_number": flat_data.flat_number}), {"_id": 0})
     if existing:
         raise HTTPException(status_code=400, detail="Flat number already exists")
     
-    flat_obj = Flat(**flat_data.model_dump())
-    await db.flats.insert_one(flat_obj.model_dump())
+    flat_obj = Flat(**flat_data.model_dump(), society_id=current_user['society_id'])
+    doc = flat_obj.model_dump()
+    doc['search_keys'] = search_keys(doc)
+    await db.flats.insert_one(doc)
+    # The monthly dues job has already run for flats that existed then.
+    now = datetime.now(timezone.utc)
+    charge = await db.monthly_charges.find_one(scoped(current_user, {"month": now.month, "year": now.year}), {"_id": 0})
+    if charge:
+        await create_dues(db, current_user['society_id'], [doc], charge)
+    await audit_log.record(current_user, "flat.create", "flat", flat_obj.id, {"flat_number": flat_obj.flat_number})
     return flat_obj
 
 @api_router.put("/flats/{flat_id}", response_model=Flat)
@@ -285,11 +586,12 @@ async def update_flat(flat_id: str, flat_data: FlatCreate, current_user: dict =
         raise HTTPException(status_code=403, detail="Admin access required")
     
     updated_data = flat_data.model_dump()
-    result = await db.flats.update_one({"id": flat_id}, {"$set": updated_data})
+    result = await db.flats.update_one(scoped(current_user, {"id": flat_id}), {"$set": {**updated_data, "search_keys": search_keys(updated_data)}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Flat not found")
     
-    flat = await db.flats.find_one({"id": flat_id}, {"_id": 0})
+    await audit_log.record(current_user, "flat.update", "flat", flat_id, updated_data)
+    flat = await db.flats.find_one(scoped(current_user, {"id": flat_id}), {"_id": 0})
     return flat
 
 @api_router.delete("/flats/{flat_id}")
@@ -297,45 +599,144 @@ async def delete_flat(flat_id: str, current_user: dict = Depends(get_current_use
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    result = await db.flats.delete_one({"id": flat_id})
-    if result.deleted_count == 0:
+    flat = await db.flats.find_one_and_delete(scoped(current_user, {"id": flat_id}), {"_id": 0, "flat_number": 1})
+    if not flat:
         raise HTTPException(status_code=404, detail="Flat not found")
+    # Residents of the flat lose access now rather than when their token expires.
+    residents = await db.users.find(
+        scoped(current_user, {"role": "resident", "flat_number": flat['flat_number']}), {"_id": 0, "id": 1}
+    ).to_list(None)
+    for resident in residents:
+        await revoke_user_sessions(resident['id'])
+    await audit_log.record(current_user, "flat.delete", "flat", flat_id)
     return {"message": "Flat deleted successfully"}
 
 # Monthly Charges Routes
 @api_router.get("/charges", response_model=List[MonthlyCharge])
-async def get_charges(current_user: dict = Depends(get_current_user)):
-    charges = await db.monthly_charges.find({}, {"_id": 0}).sort("year", -1).sort("month", -1).to_list(1000)
+async def get_charges(
+    current_user: dict = Depends(get_current_user),
+    fields: Optional[str] = Query(None, description="Comma-separated MonthlyCharge fields to return")
+):
+    selected = parse_fields(fields, MonthlyCharge.model_fields)
+    charges = await db.monthly_charges.find(scoped(current_user), mongo_projection(selected)).sort("year", -1).sort("month", -1).to_list(1000)
+    if selected:
+        return JSONResponse(content=charges)
     return charges
 
+DUES_BATCH_SIZE = 500
+
 @api_router.post("/charges", response_model=MonthlyCharge)
 async def create_charge(charge_data: MonthlyChargeCreate, current_user: dict = Depends(get_current_user)):
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
     existing = await db.monthly_charges.find_one(
-        {"month": charge_data.month, "year": charge_data.year}, {"_id": 0}
+        scoped(current_user, {"month": charge_data.month, "year": charge_data.year}), {"_id": 0}
     )
     if existing:
         raise HTTPException(status_code=400, detail="Charges for this month already exist")
     
-    charge_obj = MonthlyCharge(**charge_data.model_dump())
-    await db.monthly_charges.insert_one(charge_obj.model_dump())
+    charge_obj = MonthlyCharge(**charge_data.model_dump(), society_id=current_user['society_id'])
+    charge_doc = charge_obj.model_dump()
+    await db.monthly_charges.insert_one(charge_doc)
+    now = datetime.now(timezone.utc)
+    if (charge_obj.year, charge_obj.month) == (now.year, now.month):
+        # Dues are otherwise only generated on the scheduler's next tick.
+        cursor = db.flats.find(scoped(current_user), {"_id": 0, "id": 1, "flat_number": 1, "custom_charge": 1})
+        while flats := await cursor.to_list(DUES_BATCH_SIZE):
+            await create_dues(db, current_user['society_id'], flats, charge_doc)
+    await audit_log.record(current_user, "charge.create", "monthly_charge", charge_obj.id, charge_data.model_dump())
     return charge_obj
 
+# Dues Routes
+@api_router.get("/dues")
+async def get_dues(
+    current_user: dict = Depends(get_current_user),
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    status: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    now = datetime.now(timezone.utc)
+    query = scoped(current_user, {"month": month or now.month, "year": year or now.year})
+    if status:
+        query["status"] = status
+    dues = await db.dues.find(query, {"_id": 0}).sort("flat_number", 1).skip(offset).limit(limit).to_list(limit)
+    return dues
+
+@api_router.post("/dues/reminders", status_code=202)
+async def send_dues_reminders(
+    current_user: dict = Depends(get_current_user),
+    month: Optional[int] = None,
+    year: Optional[int] = None
+):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if not reminders.transports:
+        raise HTTPException(status_code=400, detail="No reminder transport is configured")
+    
+    now = datetime.now(timezone.utc)
+    month, year = month or now.month, year or now.year
+    # Paced sends to a whole society can take minutes; poll the job for its counts.
+    job_id = await scheduler.request_reminders(current_user['society_id'], year, month)
+    await audit_log.record(current_user, "dues.remind", "dues", f"{year}-{month:02d}", {"job_id": job_id})
+    return {"job_id": job_id, "status": "running"}
+
+@api_router.get("/dues/reminders/{job_id}")
+async def get_reminders_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    run = await db.job_runs.find_one(scoped(current_user, {"_id": f"reminders-run-{job_id}"}))
+    if not run:
+        raise HTTPException(status_code=404, detail="Reminders job not found")
+    counts = run.get('counts')
+    if run.get('completed_at'):
+        status = "completed"
+    else:
+        # An attempt with failed sends is retried by the scheduler's next tick.
+        status = "retrying" if counts and counts['failed'] else "running"
+    return {
+        "job_id": job_id,
+        "month": run['month'],
+        "year": run['year'],
+        "status": status,
+        "counts": counts,
+        "requested_at": run['requested_at'].isoformat(),
+        "completed_at": run['completed_at'].isoformat() if run.get('completed_at') else None
+    }
+
 # Payments Routes
 @api_router.get("/payments", response_model=List[Payment])
-async def get_payments(current_user: dict = Depends(get_current_user), flat_id: Optional[str] = None):
-    query = {}
+async def get_payments(
+    current_user: dict = Depends(get_current_user),
+    flat_id: Optional[str] = None,
+    from_month: Optional[str] = Query(None, description="Inclusive start, YYYY-MM"),
+    to_month: Optional[str] = Query(None, description="Inclusive end, YYYY-MM"),
+    payment_method: Optional[str] = None,
+    status: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated Payment fields to return"),
+    limit: int = Query(1000, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    selected = parse_fields(fields, Payment.model_fields)
     if current_user['role'] == 'resident':
-        user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
-        flat = await db.flats.find_one({"flat_number": user.get('flat_number')}, {"_id": 0})
-        if flat:
-            query["flat_id"] = flat['id']
-    elif flat_id:
-        query["flat_id"] = flat_id
-    
-    payments = await db.payments.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
+        user = await current_user_doc(current_user)
+        flat = await db.flats.find_one(scoped(current_user, {"flat_number": user.get('flat_number')}), {"_id": 0})
+        if not flat:
+            return []
+        flat_id = flat['id']
+    
+    query = scoped(current_user, payment_filter_query(flat_id, from_month, to_month, payment_method, status, min_amount, max_amount))
+    from_period = parse_period(from_month) if from_month else None
+    payments = await payment_archive.find(query, mongo_projection(selected), from_period, offset, limit)
+    if selected:
+        return JSONResponse(content=payments)
     return payments
 
 @api_router.post("/payments", response_model=Payment)
@@ -343,111 +744,362 @@ async def create_payment(payment_data: PaymentCreate, current_user: dict = Depen
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    flat = await db.flats.find_one({"id": payment_data.flat_id}, {"_id": 0})
+    flat = await db.flats.find_one(scoped(current_user, {"id": payment_data.flat_id}), {"_id": 0})
     if not flat:
         raise HTTPException(status_code=404, detail="Flat not found")
     
-    receipt_number = f"REC-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+    receipt_number = await next_receipt_number(current_user['society_id'])
     
     payment_obj = Payment(
         **payment_data.model_dump(),
+        society_id=current_user['society_id'],
         flat_number=flat['flat_number'],
         payment_date=datetime.now(timezone.utc).isoformat(),
         receipt_number=receipt_number,
         status="paid"
     )
     await db.payments.insert_one(payment_obj.model_dump())
+    await settle_dues(db, current_user['society_id'], [(payment_obj.flat_id, payment_obj.month, payment_obj.year)])
+    await audit_log.record(current_user, "payment.create", "payment", payment_obj.id, {
+        "flat_id": payment_obj.flat_id, "month": payment_obj.month, "year": payment_obj.year,
+        "amount": payment_obj.amount, "payment_method": payment_obj.payment_method,
+        "receipt_number": payment_obj.receipt_number
+    })
     return payment_obj
 
+BULK_PAYMENT_LIMIT = 1000
+
+async def paid_dues(current_user: dict, keys: List[tuple]) -> set:
+    """The ``(flat_id, month, year)`` keys among ``keys`` that already have a paid payment."""
+    if not keys:
+        return set()
+    # An archived payment still counts, so older periods are checked in the archive too.
+    paid = await payment_archive.find_all(
+        scoped(current_user, {"flat_id": {"$in": list({k[0] for k in keys})}, "status": "paid",
+                              "month": {"$in": list({k[1] for k in keys})},
+                              "year": {"$in": list({k[2] for k in keys})}}),
+        {"_id": 0, "flat_id": 1, "month": 1, "year": 1},
+        min((k[2], k[1]) for k in keys)
+    )
+    return {(p['flat_id'], p['month'], p['year']) for p in paid} & set(keys)
+
+@api_router.post("/payments/bulk")
+async def create_payments_bulk(payments_data: List[PaymentCreate], current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if not payments_data:
+        raise HTTPException(status_code=400, detail="No payments provided")
+    if len(payments_data) > BULK_PAYMENT_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_PAYMENT_LIMIT} payments per request")
+    
+    flat_ids = list({p.flat_id for p in payments_data})
+    flats = {
+        f['id']: f for f in await db.flats.find(
+            scoped(current_user, {"id": {"$in": flat_ids}}), {"_id": 0, "id": 1, "flat_number": 1}
+        ).to_list(len(flat_ids))
+    }
+    
+    paid_keys = await paid_dues(current_user, [(p.flat_id, p.month, p.year) for p in payments_data])
+    
+    results = [None] * len(payments_data)
+    accepted = []
+    for index, payment_data in enumerate(payments_data):
+        key = (payment_data.flat_id, payment_data.month, payment_data.year)
+        if payment_data.flat_id not in flats:
+            results[index] = {"index": index, "status": "error", "detail": "Flat not found"}
+        elif key in paid_keys:
+            results[index] = {"index": index, "status": "error", "detail": "Payment already recorded for this month"}
+        else:
+            # Also catches the same flat and month appearing twice in one request.
+            paid_keys.add(key)
+            accepted.append(index)
+    
+    payment_objs = {}
+    if accepted:
+        receipt_numbers = await next_receipt_numbers(current_user['society_id'], len(accepted))
+        payment_date = datetime.now(timezone.utc).isoformat()
+        for index, receipt_number in zip(accepted, receipt_numbers):
+            payment_data = payments_data[index]
+            payment_objs[index] = Payment(
+                **payment_data.model_dump(),
+                society_id=current_user['society_id'],
+                flat_number=flats[payment_data.flat_id]['flat_number'],
+                payment_date=payment_date,
+                receipt_number=receipt_number,
+                status="paid"
+            )
+        
+        failed = {}
+        try:
+            await db.payments.bulk_write(
+                [InsertOne(payment_objs[index].model_dump()) for index in accepted], ordered=False
+            )
+        except BulkWriteError as e:
+            failed = {accepted[err['index']]: err.get('errmsg', 'Write failed') for err in e.details['writeErrors']}
+        await settle_dues(db, current_user['society_id'], [
+            (payment_objs[index].flat_id, payment_objs[index].month, payment_objs[index].year)
+            for index in accepted if index not in failed
+        ])
+        
+        for index in accepted:
+            if index in failed:
+                results[index] = {"index": index, "status": "error", "detail": failed[index]}
+                continue
+            payment_obj = payment_objs[index]
+            results[index] = {"index": index, "status": "created", "payment": payment_obj.model_dump()}
+            await audit_log.record(current_user, "payment.create", "payment", payment_obj.id, {
+                "flat_id": payment_obj.flat_id, "month": payment_obj.month, "year": payment_obj.year,
+                "amount": payment_obj.amount, "payment_method": payment_obj.payment_method,
+                "receipt_number": payment_obj.receipt_number, "bulk": True
+            })
+    
+    created = sum(1 for result in results if result['status'] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
+
 # Dashboard Stats
+DASHBOARD_STATS_FIELDS = ["total_flats", "total_collected", "pending_dues", "pending_count", "recent_payments"]
+RESIDENT_DASHBOARD_FIELDS = ["flat", "current_due", "payment_status", "payment_history", "current_charge_breakdown"]
+
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
+async def get_dashboard_stats(
+    current_user: dict = Depends(get_current_user),
+    fields: Optional[str] = Query(None, description="Comma-separated stats to compute")
+):
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    total_flats = await db.flats.count_documents({})
-    total_payments = await db.payments.count_documents({"status": "paid"})
+    # Only the requested stats are computed.
+    wanted = set(parse_fields(fields, DASHBOARD_STATS_FIELDS) or DASHBOARD_STATS_FIELDS)
+    stats = {}
     
-    payments_list = await db.payments.find({"status": "paid"}, {"_id": 0}).to_list(10000)
-    total_collected = sum(p['amount'] for p in payments_list)
-    
-    current_month = datetime.now(timezone.utc).month
-    current_year = datetime.now(timezone.utc).year
-    current_charge = await db.monthly_charges.find_one(
-        {"month": current_month, "year": current_year}, {"_id": 0}
-    )
+    if wanted & {"total_flats", "pending_dues", "pending_count"}:
+        total_flats = await analytics_db.flats.count_documents(scoped(current_user), maxTimeMS=ANALYTICS_MAX_TIME_MS)
+        stats["total_flats"] = total_flats
     
-    paid_flats = await db.payments.distinct("flat_id", 
-        {"month": current_month, "year": current_year, "status": "paid"})
-    pending_count = total_flats - len(paid_flats)
+    if "total_collected" in wanted:
+        stats["total_collected"] = await payment_archive.total_paid(
+            analytics_db, scoped(current_user, {"status": "paid"}), ANALYTICS_MAX_TIME_MS
+        )
     
-    base_charge = current_charge['base_charge'] if current_charge else 0
-    pending_amount = pending_count * base_charge
+    if wanted & {"pending_dues", "pending_count"}:
+        current_month = datetime.now(timezone.utc).month
+        current_year = datetime.now(timezone.utc).year
+        current_charge = await analytics_db.monthly_charges.find_one(
+            scoped(current_user, {"month": current_month, "year": current_year}), {"_id": 0},
+            max_time_ms=ANALYTICS_MAX_TIME_MS
+        )
+        
+        paid = await analytics_db.payments.aggregate([
+            {"$match": scoped(current_user, {"month": current_month, "year": current_year, "status": "paid"})},
+            {"$group": {"_id": "$flat_id"}},
+            {"$count": "flats"}
+        ], maxTimeMS=ANALYTICS_MAX_TIME_MS).to_list(1)
+        pending_count = total_flats - (paid[0]['flats'] if paid else 0)
+        
+        base_charge = current_charge['base_charge'] if current_charge else 0
+        stats["pending_dues"] = pending_count * base_charge
+        stats["pending_count"] = pending_count
     
-    recent_payments = await db.payments.find({}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
+    if "recent_payments" in wanted:
+        stats["recent_payments"] = await analytics_db.payments.find(scoped(current_user), {"_id": 0}).sort("created_at", -1).limit(5).max_time_ms(ANALYTICS_MAX_TIME_MS).to_list(5)
     
-    return {
-        "total_flats": total_flats,
-        "total_collected": total_collected,
-        "pending_dues": pending_amount,
-        "pending_count": pending_count,
-        "recent_payments": recent_payments
-    }
+    return {field: stats[field] for field in DASHBOARD_STATS_FIELDS if field in wanted}
 
 @api_router.get("/dashboard/resident")
-async def get_resident_dashboard(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+async def get_resident_dashboard(
+    current_user: dict = Depends(get_current_user),
+    fields: Optional[str] = Query(None, description="Comma-separated sections, or flat.<field> / payment_history.<field>")
+):
+    selected = parse_fields(
+        fields,
+        RESIDENT_DASHBOARD_FIELDS + nested_fields(Flat.model_fields, "flat") + nested_fields(Payment.model_fields, "payment_history")
+    )
+    wanted = split_fields(selected) if selected else dict.fromkeys(RESIDENT_DASHBOARD_FIELDS)
+    
+    user = await current_user_doc(current_user)
     if not user or not user.get('flat_number'):
         raise HTTPException(status_code=404, detail="Flat not found for user")
     
-    flat = await db.flats.find_one({"flat_number": user['flat_number']}, {"_id": 0})
+    flat = await db.flats.find_one(scoped(current_user, {"flat_number": user['flat_number']}), {"_id": 0, "search_keys": 0})
     if not flat:
         raise HTTPException(status_code=404, detail="Flat details not found")
     
     current_month = datetime.now(timezone.utc).month
     current_year = datetime.now(timezone.utc).year
+    dashboard = {}
     
-    current_charge = await db.monthly_charges.find_one(
-        {"month": current_month, "year": current_year}, {"_id": 0}
-    )
+    if "flat" in wanted:
+        dashboard["flat"] = flat if wanted["flat"] is None else {k: flat[k] for k in wanted["flat"] if k in flat}
     
-    due_amount = flat.get('custom_charge') or (current_charge['base_charge'] if current_charge else 0)
+    if "current_due" in wanted or "current_charge_breakdown" in wanted:
+        current_charge = await db.monthly_charges.find_one(
+            scoped(current_user, {"month": current_month, "year": current_year}), {"_id": 0}
+        )
+        due = await db.dues.find_one(
+            scoped(current_user, {"flat_id": flat['id'], "month": current_month, "year": current_year}), {"_id": 0}
+        )
+        dashboard["current_due"] = amount_due(flat, current_charge, due) if current_charge else 0
+        dashboard["current_charge_breakdown"] = current_charge.get('breakdown', {}) if current_charge else {}
     
-    payment = await db.payments.find_one(
-        {"flat_id": flat['id'], "month": current_month, "year": current_year, "status": "paid"},
-        {"_id": 0}
-    )
+    if "payment_status" in wanted:
+        payment = await db.payments.find_one(
+            scoped(current_user, {"flat_id": flat['id'], "month": current_month, "year": current_year, "status": "paid"}),
+            {"_id": 0, "id": 1}
+        )
+        dashboard["payment_status"] = "paid" if payment else "pending"
     
-    payments_history = await db.payments.find(
-        {"flat_id": flat['id']}, {"_id": 0}
-    ).sort("created_at", -1).limit(10).to_list(10)
+    if "payment_history" in wanted:
+        history_fields = wanted["payment_history"]
+        dashboard["payment_history"] = await db.payments.find(
+            scoped(current_user, {"flat_id": flat['id']}), mongo_projection(history_fields)
+        ).sort("created_at", -1).limit(10).to_list(10)
     
-    return {
-        "flat": flat,
-        "current_due": due_amount,
-        "payment_status": "paid" if payment else "pending",
-        "payment_history": payments_history,
-        "current_charge_breakdown": current_charge.get('breakdown', {}) if current_charge else {}
+    return {field: dashboard[field] for field in RESIDENT_DASHBOARD_FIELDS if field in wanted}
+
+# Reports
+@api_router.get("/reports/expenses")
+async def get_expense_report(
+    current_user: dict = Depends(get_current_user),
+    years: Optional[str] = Query(None, description="Comma-separated years; defaults to the last three")
+):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    now = datetime.now(timezone.utc)
+    if years:
+        try:
+            year_list = [int(y) for y in years.split(',') if y.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="years must be comma-separated integers")
+        if not year_list or len(year_list) > 50:
+            raise HTTPException(status_code=400, detail="Provide between 1 and 50 years")
+    else:
+        year_list = [now.year - 2, now.year - 1, now.year]
+    
+    return {"years": await expense_reports.yearly_summary(current_user['society_id'], year_list, now)}
+
+# Gateway Checkout Helpers
+CHECKOUT_ITEM_LIMIT = 36
+
+async def price_dues(current_user: dict, items: List[DueItem]) -> List[dict]:
+    """Price the (flat, month) dues of one checkout with one query per collection."""
+    if not items:
+        raise HTTPException(status_code=400, detail="No dues selected")
+    if len(items) > CHECKOUT_ITEM_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {CHECKOUT_ITEM_LIMIT} dues per checkout")
+    keys = [(item.flat_id, item.month, item.year) for item in items]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=400, detail="The same flat and month is selected twice")
+    
+    flat_ids = list({item.flat_id for item in items})
+    periods = list({(item.year, item.month) for item in items})
+    flats = {
+        f['id']: f for f in await db.flats.find(
+            scoped(current_user, {"id": {"$in": flat_ids}}), {"_id": 0, "id": 1, "flat_number": 1, "custom_charge": 1}
+        ).to_list(len(flat_ids))
     }
+    charges = {
+        (c['year'], c['month']): c for c in await db.monthly_charges.find(
+            scoped(current_user, {"$or": [{"year": year, "month": month} for year, month in periods]}),
+            {"_id": 0, "year": 1, "month": 1, "base_charge": 1}
+        ).to_list(len(periods))
+    }
+    dues = {
+        (d['flat_id'], d['month'], d['year']): d for d in await db.dues.find(
+            scoped(current_user, {"flat_id": {"$in": flat_ids},
+                                  "$or": [{"year": year, "month": month} for year, month in periods]}),
+            {"_id": 0, "flat_id": 1, "month": 1, "year": 1, "amount": 1, "late_fee": 1}
+        ).to_list(None)
+    }
+    paid = await paid_dues(current_user, keys)
+    
+    priced = []
+    for item in items:
+        flat = flats.get(item.flat_id)
+        if not flat:
+            raise HTTPException(status_code=404, detail=f"Flat not found: {item.flat_id}")
+        charge = charges.get((item.year, item.month))
+        if not charge:
+            raise HTTPException(status_code=404, detail=f"Charges not set for {item.month}/{item.year}")
+        if (item.flat_id, item.month, item.year) in paid:
+            raise HTTPException(status_code=400, detail=f"Flat {flat['flat_number']} has already paid for {item.month}/{item.year}")
+        priced.append({
+            "flat_id": item.flat_id, "flat_number": flat['flat_number'], "month": item.month, "year": item.year,
+            "amount": amount_due(flat, charge, dues.get((item.flat_id, item.month, item.year)))
+        })
+    return priced
+
+async def mark_transaction_paid(current_user: dict, session_id: str, fields: Optional[dict] = None) -> Optional[dict]:
+    """Flip a pending transaction to paid; return it as it was, or ``None`` if another request already did."""
+    return await db.payment_transactions.find_one_and_update(
+        scoped(current_user, {"session_id": session_id, "payment_status": {"$ne": "paid"}}),
+        {"$set": {"payment_status": "paid", **(fields or {})}, "$unset": {"expires_at": ""}},
+        projection={"_id": 0}
+    )
+
+async def record_gateway_payments(current_user: dict, transaction: dict, payment_method: str) -> int:
+    """Record a payment per due a paid transaction covers; return how many were recorded.
+    
+    Dues paid some other way in the meantime are skipped. Receipt numbers come from
+    one counter update and all payments are written with one bulk write.
+    """
+    items = transaction.get('items') or [
+        {key: transaction[key] for key in ("flat_id", "month", "year", "amount")}
+    ]
+    paid = await paid_dues(current_user, [(i['flat_id'], i['month'], i['year']) for i in items])
+    items = [i for i in items if (i['flat_id'], i['month'], i['year']) not in paid]
+    if not items:
+        return 0
+    
+    missing = list({i['flat_id'] for i in items if not i.get('flat_number')})
+    if missing:
+        flat_numbers = {
+            f['id']: f['flat_number'] for f in await db.flats.find(
+                scoped(current_user, {"id": {"$in": missing}}), {"_id": 0, "id": 1, "flat_number": 1}
+            ).to_list(len(missing))
+        }
+        items = [{**i, "flat_number": i.get('flat_number') or flat_numbers.get(i['flat_id'], "")} for i in items]
+    
+    receipt_numbers = await next_receipt_numbers(current_user['society_id'], len(items))
+    payment_date = datetime.now(timezone.utc).isoformat()
+    await db.payments.bulk_write([
+        InsertOne(Payment(
+            society_id=current_user['society_id'],
+            flat_id=item['flat_id'],
+            flat_number=item['flat_number'],
+            month=item['month'],
+            year=item['year'],
+            amount=item['amount'],
+            payment_date=payment_date,
+            payment_method=payment_method,
+            receipt_number=receipt_number,
+            status="paid"
+        ).model_dump())
+        for item, receipt_number in zip(items, receipt_numbers)
+    ], ordered=False)
+    await settle_dues(db, current_user['society_id'], [(i['flat_id'], i['month'], i['year']) for i in items])
+    return len(items)
 
 # Stripe Payment Routes
 @api_router.post("/payments/checkout")
 async def create_checkout_session(checkout_req: CheckoutRequest, current_user: dict = Depends(get_current_user)):
-    flat = await db.flats.find_one({"id": checkout_req.flat_id}, {"_id": 0})
+    flat = await db.flats.find_one(scoped(current_user, {"id": checkout_req.flat_id}), {"_id": 0})
     if not flat:
         raise HTTPException(status_code=404, detail="Flat not found")
     
     charge = await db.monthly_charges.find_one(
-        {"month": checkout_req.month, "year": checkout_req.year}, {"_id": 0}
+        scoped(current_user, {"month": checkout_req.month, "year": checkout_req.year}), {"_id": 0}
     )
     if not charge:
         raise HTTPException(status_code=404, detail="Charges not set for this month")
     
-    amount = flat.get('custom_charge') or charge['base_charge']
+    due = await db.dues.find_one(
+        scoped(current_user, {"flat_id": checkout_req.flat_id, "month": checkout_req.month, "year": checkout_req.year}), {"_id": 0}
+    )
+    amount = amount_due(flat, charge, due)
     
-    stripe_api_key = os.environ.get('STRIPE_API_KEY')
     webhook_url = f"{checkout_req.origin_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
+    stripe_checkout = gateways.stripe_checkout(webhook_url=webhook_url)
     
     success_url = f"{checkout_req.origin_url}/payment-success?session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{checkout_req.origin_url}/dashboard"
@@ -459,7 +1111,7 @@ async def create_checkout_session(checkout_req: CheckoutRequest, current_user: d
         "user_id": current_user['user_id']
     }
     
-    checkout_request = CheckoutSessionRequest(
+    checkout_request = gateways.stripe_session_request(
         amount=amount,
         currency="usd",
         success_url=success_url,
@@ -467,9 +1119,10 @@ async def create_checkout_session(checkout_req: CheckoutRequest, current_user: d
         metadata=metadata
     )
     
-    session: CheckoutSessionResponse = await stripe_checkout.create_checkout_session(checkout_request)
+    session = await stripe_checkout.create_checkout_session(checkout_request)
     
     transaction = PaymentTransaction(
+        society_id=current_user['society_id'],
         session_id=session.session_id,
         flat_id=checkout_req.flat_id,
         month=checkout_req.month,
@@ -483,45 +1136,58 @@ async def create_checkout_session(checkout_req: CheckoutRequest, current_user: d
     
     return {"url": session.url, "session_id": session.session_id}
 
+@api_router.post("/payments/checkout/multi")
+async def create_multi_checkout_session(checkout_req: MultiCheckoutRequest, current_user: dict = Depends(get_current_user)):
+    items = await price_dues(current_user, checkout_req.items)
+    amount = round(sum(item['amount'] for item in items), 2)
+    
+    webhook_url = f"{checkout_req.origin_url}/api/webhook/stripe"
+    stripe_checkout = gateways.stripe_checkout(webhook_url=webhook_url)
+    
+    success_url = f"{checkout_req.origin_url}/payment-success?session_id={{CHECKOUT_SESSION_ID}}"
+    cancel_url = f"{checkout_req.origin_url}/dashboard"
+    
+    # Gateway metadata is size-limited; the dues themselves stay on the transaction.
+    metadata = {"items": str(len(items)), "user_id": current_user['user_id']}
+    
+    checkout_request = gateways.stripe_session_request(
+        amount=amount,
+        currency="usd",
+        success_url=success_url,
+        cancel_url=cancel_url,
+        metadata=metadata
+    )
+    
+    session = await stripe_checkout.create_checkout_session(checkout_request)
+    
+    transaction = PaymentTransaction(
+        society_id=current_user['society_id'],
+        session_id=session.session_id,
+        items=items,
+        amount=amount,
+        currency="usd",
+        payment_status="pending",
+        metadata=metadata
+    )
+    await db.payment_transactions.insert_one(transaction.model_dump())
+    
+    return {"url": session.url, "session_id": session.session_id, "amount": amount, "items": items}
+
 @api_router.get("/payments/checkout/status/{session_id}")
 async def get_checkout_status(session_id: str, current_user: dict = Depends(get_current_user)):
-    transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
+    transaction = await db.payment_transactions.find_one(scoped(current_user, {"session_id": session_id}), {"_id": 0})
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
-    stripe_api_key = os.environ.get('STRIPE_API_KEY')
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url="")
+    stripe_checkout = gateways.stripe_checkout()
     
-    checkout_status: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)
+    checkout_status = await stripe_checkout.get_checkout_status(session_id)
     
     if checkout_status.payment_status == "paid" and transaction['payment_status'] != "paid":
-        await db.payment_transactions.update_one(
-            {"session_id": session_id},
-            {"$set": {"payment_status": "paid"}}
-        )
-        
-        existing_payment = await db.payments.find_one(
-            {"flat_id": transaction['flat_id'], "month": transaction['month'], 
-             "year": transaction['year'], "status": "paid"},
-            {"_id": 0}
-        )
-        
-        if not existing_payment:
-            flat = await db.flats.find_one({"id": transaction['flat_id']}, {"_id": 0})
-            receipt_number = f"REC-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-            
-            payment = Payment(
-                flat_id=transaction['flat_id'],
-                flat_number=flat['flat_number'],
-                month=transaction['month'],
-                year=transaction['year'],
-                amount=transaction['amount'],
-                payment_date=datetime.now(timezone.utc).isoformat(),
-                payment_method="stripe",
-                receipt_number=receipt_number,
-                status="paid"
-            )
-            await db.payments.insert_one(payment.model_dump())
+        # Only the request that flips the transaction records its payments.
+        paid_transaction = await mark_transaction_paid(current_user, session_id)
+        if paid_transaction:
+            await record_gateway_payments(current_user, paid_transaction, "stripe")
     
     return {
         "status": checkout_status.status,
@@ -535,8 +1201,7 @@ async def stripe_webhook(request: Request):
     body = await request.body()
     signature = request.headers.get("Stripe-Signature")
     
-    stripe_api_key = os.environ.get('STRIPE_API_KEY')
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url="")
+    stripe_checkout = gateways.stripe_checkout()
     
     try:
         webhook_response = await stripe_checkout.handle_webhook(body, signature)
@@ -550,28 +1215,36 @@ class RazorpayOrderRequest(BaseModel):
     month: int
     year: int
 
+class RazorpayMultiOrderRequest(BaseModel):
+    items: List[DueItem]
+
 class RazorpayVerifyRequest(BaseModel):
     razorpay_order_id: str
     razorpay_payment_id: str
     razorpay_signature: str
-    flat_id: str
-    month: int
-    year: int
+    # Accepted for older clients; the dues paid are taken from the stored order.
+    flat_id: Optional[str] = None
+    month: Optional[int] = None
+    year: Optional[int] = None
 
 @api_router.post("/payments/razorpay/create-order")
 async def create_razorpay_order(order_req: RazorpayOrderRequest, current_user: dict = Depends(get_current_user)):
-    flat = await db.flats.find_one({"id": order_req.flat_id}, {"_id": 0})
+    flat = await db.flats.find_one(scoped(current_user, {"id": order_req.flat_id}), {"_id": 0})
     if not flat:
         raise HTTPException(status_code=404, detail="Flat not found")
     
     charge = await db.monthly_charges.find_one(
-        {"month": order_req.month, "year": order_req.year}, {"_id": 0}
+        scoped(current_user, {"month": order_req.month, "year": order_req.year}), {"_id": 0}
     )
     if not charge:
         raise HTTPException(status_code=404, detail="Charges not set for this month")
     
-    amount = flat.get('custom_charge') or charge['base_charge']
+    due = await db.dues.find_one(
+        scoped(current_user, {"flat_id": order_req.flat_id, "month": order_req.month, "year": order_req.year}), {"_id": 0}
+    )
+    amount = amount_due(flat, charge, due)
     amount_paise = int(amount * 100)
+    razorpay_client = gateways.razorpay_client()
     
     try:
         razor_order = razorpay_client.order.create({
@@ -587,6 +1260,7 @@ async def create_razorpay_order(order_req: RazorpayOrderRequest, current_user: d
         })
         
         transaction = PaymentTransaction(
+            society_id=current_user['society_id'],
             session_id=razor_order["id"],
             flat_id=order_req.flat_id,
             month=order_req.month,
@@ -612,8 +1286,47 @@ async def create_razorpay_order(order_req: RazorpayOrderRequest, current_user: d
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/payments/razorpay/create-multi-order")
+async def create_razorpay_multi_order(order_req: RazorpayMultiOrderRequest, current_user: dict = Depends(get_current_user)):
+    items = await price_dues(current_user, order_req.items)
+    amount = round(sum(item['amount'] for item in items), 2)
+    amount_paise = int(round(amount * 100))
+    razorpay_client = gateways.razorpay_client()
+    notes = {"items": str(len(items)), "user_id": current_user['user_id']}
+    
+    try:
+        razor_order = razorpay_client.order.create({
+            "amount": amount_paise,
+            "currency": "INR",
+            "payment_capture": 1,
+            "notes": notes
+        })
+        
+        transaction = PaymentTransaction(
+            society_id=current_user['society_id'],
+            session_id=razor_order["id"],
+            items=items,
+            amount=amount,
+            currency="INR",
+            payment_status="pending",
+            metadata=notes
+        )
+        await db.payment_transactions.insert_one(transaction.model_dump())
+        
+        return {
+            "order_id": razor_order["id"],
+            "amount": amount_paise,
+            "currency": "INR",
+            "key_id": os.environ.get('RAZORPAY_KEY_ID'),
+            "items": items
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.post("/payments/razorpay/verify")
 async def verify_razorpay_payment(verify_req: RazorpayVerifyRequest, current_user: dict = Depends(get_current_user)):
+    razorpay = gateways.razorpay_module()
+    razorpay_client = gateways.razorpay_client()
     try:
         razorpay_client.utility.verify_payment_signature({
             'razorpay_order_id': verify_req.razorpay_order_id,
@@ -622,7 +1335,7 @@ async def verify_razorpay_payment(verify_req: RazorpayVerifyRequest, current_use
         })
         
         transaction = await db.payment_transactions.find_one(
-            {"session_id": verify_req.razorpay_order_id}, {"_id": 0}
+            scoped(current_user, {"session_id": verify_req.razorpay_order_id}), {"_id": 0}
         )
         
         if not transaction:
@@ -631,33 +1344,12 @@ async def verify_razorpay_payment(verify_req: RazorpayVerifyRequest, current_use
         if transaction['payment_status'] == "paid":
             return {"status": "success", "message": "Payment already recorded"}
         
-        await db.payment_transactions.update_one(
-            {"session_id": verify_req.razorpay_order_id},
-            {"$set": {"payment_status": "paid", "razorpay_payment_id": verify_req.razorpay_payment_id}}
+        paid_transaction = await mark_transaction_paid(
+            current_user, verify_req.razorpay_order_id, {"razorpay_payment_id": verify_req.razorpay_payment_id}
         )
-        
-        existing_payment = await db.payments.find_one(
-            {"flat_id": verify_req.flat_id, "month": verify_req.month, 
-             "year": verify_req.year, "status": "paid"},
-            {"_id": 0}
-        )
-        
-        if not existing_payment:
-            flat = await db.flats.find_one({"id": verify_req.flat_id}, {"_id": 0})
-            receipt_number = f"REC-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-            
-            payment = Payment(
-                flat_id=verify_req.flat_id,
-                flat_number=flat['flat_number'],
-                month=verify_req.month,
-                year=verify_req.year,
-                amount=transaction['amount'],
-                payment_date=datetime.now(timezone.utc).isoformat(),
-                payment_method="razorpay",
-                receipt_number=receipt_number,
-                status="paid"
-            )
-            await db.payments.insert_one(payment.model_dump())
+        if not paid_transaction:
+            return {"status": "success", "message": "Payment already recorded"}
+        await record_gateway_payments(current_user, paid_transaction, "razorpay")
         
         return {"status": "success", "message": "Payment verified and recorded"}
     except razorpay.errors.SignatureVerificationError:
@@ -669,6 +1361,7 @@ async def verify_razorpay_payment(verify_req: RazorpayVerifyRequest, current_use
 async def razorpay_webhook(request: Request):
     body = await request.body()
     signature = request.headers.get("X-Razorpay-Signature")
+    razorpay_client = gateways.razorpay_client()
     
     try:
         razorpay_client.utility.verify_webhook_signature(
@@ -680,6 +1373,51 @@ async def razorpay_webhook(request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+# Batch Route
+# One round trip for a page's worth of calls. Session endpoints, raw-body and
+# streaming endpoints and the gateways' webhooks only make sense on their own.
+batch_runner = BatchRunner(
+    app,
+    api_router.prefix,
+    excluded=[f"{api_router.prefix}{path}" for path in (
+        "/batch", "/auth/register", "/auth/login", "/auth/refresh", "/auth/logout",
+        "/admin/backup", "/admin/restore", "/webhook/stripe", "/webhook/razorpay"
+    )],
+    max_requests=int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+)
+
+@api_router.post("/batch")
+async def run_batch(batch: BatchRequest, request: Request, current_user: dict = Depends(get_current_user)):
+    return {"responses": await batch_runner.run(request.scope, batch.requests, current_user)}
+
+# Health Probes
+@app.get("/healthz")
+async def healthz():
+    # Liveness: never touches Mongo, only reports the last cached ping.
+    return {
+        "status": "ok",
+        "mongo": mongo_health.last_result,
+        "pool": pool_stats.snapshot(MONGO_MAX_POOL_SIZE),
+        "analytics_pool": analytics_pool_stats.snapshot(ANALYTICS_MAX_POOL_SIZE),
+        "audit": audit_log.stats()
+    }
+
+@app.get("/readyz")
+async def readyz():
+    mongo = await mongo_health.check()
+    # Not ready until the startup migrations and indexes have run, even if Mongo answers.
+    ready = mongo['ok'] and database_prepared.is_set()
+    body = {
+        "status": "ready" if ready else ("preparing" if mongo['ok'] else "unavailable"),
+        "mongo": mongo,
+        "pool": pool_stats.snapshot(MONGO_MAX_POOL_SIZE)
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+@app.exception_handler(ExecutionTimeout)
+async def analytics_timeout_handler(request: Request, exc: ExecutionTimeout):
+    return JSONResponse(status_code=503, content={"detail": "Report took too long; try a narrower range"})
+
 app.include_router(api_router)
 
 app.add_middleware(
@@ -696,6 +1434,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+DB_PREPARE_RETRY_SECONDS = float(os.environ.get('DB_PREPARE_RETRY_SECONDS', 5))
+database_prepared = asyncio.Event()
+prepare_task: Optional[asyncio.Task] = None
+
+async def prepare_database() -> bool:
+    """Run the startup migrations and index builds; return whether they all ran.
+
+    Every step is idempotent, so a failed attempt is simply repeated. The
+    scheduler only starts once they have run.
+    """
+    result = await mongo_health.check()
+    if not result['ok']:
+        logger.warning("MongoDB not reachable: %s", result['error'])
+        return False
+    logger.info("MongoDB reachable (%.1f ms)", result['latency_ms'])
+    try:
+        await backfill_society_ids(db)
+        await ensure_indexes(db)
+        await backfill_search_keys(db)
+        await backfill_transaction_expiry(db, PENDING_TRANSACTION_TTL)
+        await payment_archive.ensure_collection()
+        if isinstance(rate_limiter.backend, MongoBuckets):
+            await rate_limiter.backend.ensure_indexes()
+    except Exception:
+        logger.exception("Preparing the database failed")
+        return False
+    database_prepared.set()
+    if os.environ.get('SCHEDULER_ENABLED', '1') == '1':
+        scheduler.start()
+    return True
+
+async def prepare_database_until_done():
+    while not await prepare_database():
+        await asyncio.sleep(DB_PREPARE_RETRY_SECONDS)
+
+@app.on_event("startup")
+async def check_db_connection():
+    global prepare_task
+    # /readyz keeps failing until this has succeeded, retried in the background.
+    if not await prepare_database():
+        logger.warning("Retrying database preparation every %gs", DB_PREPARE_RETRY_SECONDS)
+        prepare_task = asyncio.create_task(prepare_database_until_done())
+    await audit_log.start()
+    revocations.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if prepare_task is not None:
+        prepare_task.cancel()
+    await scheduler.stop()
+    await reminders.close()
+    await revocations.stop()
+    await audit_log.stop()
+    analytics_client.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""Multi-society tenancy.
+
+Every society-owned document (users, flats, charges, payments, dues, gateway
+transactions, audit events) carries a ``society_id``. The id is put in the JWT
+when a user logs in, and every query a request makes goes through ``scoped`` so
+it can only ever match that society's documents.
+
+Indexes on these collections lead with ``society_id`` (see ``indexes.py``), so a
+tenant's queries never scan another tenant's entries, and ``{society_id: 1,
+id: 1}`` is usable as a shard key: when the cluster is sharded each society's
+data lives on one chunk range and its queries are routed to a single shard.
+
+Deployments from before tenancy existed are migrated into ``DEFAULT_SOCIETY_ID``
+at startup, and tokens issued before then are read as belonging to it.
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCIETY_ID = os.environ.get('DEFAULT_SOCIETY_ID', 'default')
+
+TENANT_COLLECTIONS = [
+    "users", "flats", "monthly_charges", "payments", "payments_archive",
+    "dues", "payment_transactions", "audit_log"
+]
+
+
+def scoped(current_user: dict, query: Optional[dict] = None) -> dict:
+    """``query`` restricted to the caller's society."""
+    return {"society_id": current_user['society_id'], **(query or {})}
+
+
+async def ensure_society(db, society_id: str, name: Optional[str] = None) -> bool:
+    """Create the society if it does not exist yet; return whether it was created."""
+    result = await db.societies.update_one(
+        {"id": society_id},
+        {"$setOnInsert": {"id": society_id, "name": name or society_id,
+                          "created_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    return result.upserted_id is not None
+
+
+async def backfill_society_ids(db):
+    """Move documents written before tenancy existed into the default society."""
+    await ensure_society(db, DEFAULT_SOCIETY_ID)
+    for collection in TENANT_COLLECTIONS:
+        result = await db[collection].update_many(
+            {"society_id": {"$exists": False}}, {"$set": {"society_id": DEFAULT_SOCIETY_ID}}
+        )
+        if result.modified_count:
+            logger.info("Assigned %d %s documents to society %s",
+                        result.modified_count, collection, DEFAULT_SOCIETY_ID)
+    await _seed_receipt_counters(db)
+
+
+async def _seed_receipt_counters(db):
+    """Continue the default society's receipt sequences from the shared ``receipt-<day>`` counters.
+
+    Receipt numbers only carry the day, so without this a society's first
+    receipts of a migration day would reuse numbers already issued that day.
+    """
+    legacy = await db.counters.find({"_id": {"$regex": r"^receipt-\d{8}$"}}).to_list(None)
+    if legacy:
+        await db.counters.bulk_write([
+            UpdateOne({"_id": f"receipt-{DEFAULT_SOCIETY_ID}-{counter['_id'][len('receipt-'):]}"},
+                      {"$max": {"seq": counter['seq']}}, upsert=True)
+            for counter in legacy
+        ], ordered=False)
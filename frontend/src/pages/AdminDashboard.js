@@ -4,7 +4,7 @@ import { toast } from 'sonner';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Building2, DollarSign, AlertCircle, Receipt, LogOut, Users, CreditCard, CalendarDays, Shield } from 'lucide-react';
-import api from '@/utils/api';
+import { batchGet, logout } from '@/utils/api';
 
 export default function AdminDashboard() {
   const navigate = useNavigate();
@@ -14,25 +14,17 @@ export default function AdminDashboard() {
   const user = JSON.parse(localStorage.getItem('user') || '{}');
 
   useEffect(() => {
-    fetchStats();
-    if (user.is_super_admin) {
-      fetchPendingAdmins();
-    }
+    fetchDashboard();
   }, []);
 
-  const fetchPendingAdmins = async () => {
-    try {
-      const { data } = await api.get('/admin/pending');
-      setPendingAdminsCount(data.length);
-    } catch (error) {
-      console.error('Failed to fetch pending admins');
-    }
-  };
-
-  const fetchStats = async () => {
+  const fetchDashboard = async () => {
     try {
-      const { data } = await api.get('/dashboard/stats');
-      setStats(data);
+      const paths = user.is_super_admin ? ['/dashboard/stats', '/admin/pending'] : ['/dashboard/stats'];
+      const [statsRes, pendingRes] = await batchGet(paths);
+      setStats(statsRes.data);
+      if (pendingRes) {
+        setPendingAdminsCount(pendingRes.data.length);
+      }
     } catch (error) {
       toast.error('Failed to load dashboard data');
     } finally {
@@ -40,9 +32,8 @@ export default function AdminDashboard() {
     }
   };
 
-  const handleLogout = () => {
-    localStorage.removeItem('token');
-    localStorage.removeItem('user');
+  const handleLogout = async () => {
+    await logout();
     navigate('/');
   };
 
@@ -7,7 +7,7 @@ import { Label } from '@/components/ui/label';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { AlertCircle, CheckCircle, ArrowLeft, DollarSign } from 'lucide-react';
-import api from '@/utils/api';
+import api, { batchGet } from '@/utils/api';
 
 export default function DuesManagement() {
   const navigate = useNavigate();
@@ -29,11 +29,7 @@ export default function DuesManagement() {
   const fetchData = async () => {
     setLoading(true);
     try {
-      const [flatsRes, paymentsRes, chargesRes] = await Promise.all([
-        api.get('/flats'),
-        api.get('/payments'),
-        api.get('/charges')
-      ]);
+      const [flatsRes, paymentsRes, chargesRes] = await batchGet(['/flats', '/payments', '/charges']);
       setFlats(flatsRes.data);
       setPayments(paymentsRes.data);
       setCharges(chargesRes.data);
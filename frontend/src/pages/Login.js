@@ -7,7 +7,7 @@ import { Label } from '@/components/ui/label';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Building2 } from 'lucide-react';
-import api from '@/utils/api';
+import api, { saveSession } from '@/utils/api';
 
 export default function Login() {
   const navigate = useNavigate();
@@ -27,8 +27,7 @@ export default function Login() {
     setLoading(true);
     try {
       const { data } = await api.post('/auth/login', loginData);
-      localStorage.setItem('token', data.token);
-      localStorage.setItem('user', JSON.stringify(data.user));
+      saveSession(data);
       toast.success('Login successful!');
       navigate('/dashboard');
     } catch (error) {
@@ -55,8 +54,7 @@ export default function Login() {
           phone: ''
         });
       } else {
-        localStorage.setItem('token', data.token);
-        localStorage.setItem('user', JSON.stringify(data.user));
+        saveSession(data);
         toast.success('Registration successful!');
         navigate('/dashboard');
       }
@@ -7,7 +7,7 @@ import { Label } from '@/components/ui/label';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogTrigger } from '@/components/ui/dialog';
 import { CreditCard, Plus, ArrowLeft } from 'lucide-react';
-import api from '@/utils/api';
+import api, { batchGet } from '@/utils/api';
 
 export default function Payments() {
   const navigate = useNavigate();
@@ -29,10 +29,7 @@ export default function Payments() {
 
   const fetchData = async () => {
     try {
-      const [paymentsRes, flatsRes] = await Promise.all([
-        api.get('/payments'),
-        api.get('/flats')
-      ]);
+      const [paymentsRes, flatsRes] = await batchGet(['/payments', '/flats']);
       setPayments(paymentsRes.data);
       setFlats(flatsRes.data);
     } catch (error) {
@@ -5,7 +5,7 @@ import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from '@/components/ui/card';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { Building2, DollarSign, Receipt, LogOut, CreditCard, AlertCircle, CheckCircle } from 'lucide-react';
-import api from '@/utils/api';
+import api, { logout } from '@/utils/api';
 
 // Load Razorpay script
 const loadRazorpayScript = () => {
@@ -134,9 +134,8 @@ export default function ResidentDashboard() {
     }
   };
 
-  const handleLogout = () => {
-    localStorage.removeItem('token');
-    localStorage.removeItem('user');
+  const handleLogout = async () => {
+    await logout();
     navigate('/');
   };
 
@@ -15,12 +15,81 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+export const saveSession = (data) => {
+  localStorage.setItem('token', data.token);
+  if (data.refresh_token) {
+    localStorage.setItem('refresh_token', data.refresh_token);
+  }
+  if (data.user) {
+    localStorage.setItem('user', JSON.stringify(data.user));
+  }
+};
+
+export const clearSession = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refresh_token');
+  localStorage.removeItem('user');
+};
+
+const SESSION_ENDPOINTS = ['/auth/login', '/auth/register', '/auth/refresh', '/auth/logout'];
+
+// Access tokens are short-lived; concurrent 401s share one refresh call.
+let refreshing = null;
+
+const refreshSession = () => {
+  if (!refreshing) {
+    const refresh_token = localStorage.getItem('refresh_token');
+    refreshing = (refresh_token
+      ? axios.post(`${API}/auth/refresh`, { refresh_token }).then(({ data }) => saveSession(data))
+      : Promise.reject(new Error('No refresh token'))
+    ).finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+};
+
+// Several GETs in one round trip through /batch. Resolves like Promise.all over
+// api.get: one { data } per path, or rejects with the first failed call.
+export const batchGet = async (paths) => {
+  const { data } = await api.post('/batch', {
+    requests: paths.map((path) => ({ method: 'GET', path })),
+  });
+  return data.responses.map((response) => {
+    if (response.status >= 400) {
+      const error = new Error(`GET ${response.path} failed with status ${response.status}`);
+      error.response = { status: response.status, data: response.body };
+      throw error;
+    }
+    return { data: response.body };
+  });
+};
+
+export const logout = async () => {
+  try {
+    await api.post('/auth/logout', { refresh_token: localStorage.getItem('refresh_token') });
+  } catch (error) {
+    // The session is cleared locally either way.
+  }
+  clearSession();
+};
+
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401) {
-      localStorage.removeItem('token');
-      localStorage.removeItem('user');
+  async (error) => {
+    const original = error.config;
+    const isAuthCall = SESSION_ENDPOINTS.includes(original?.url);
+    if (error.response?.status === 401 && original && !original._retried && !isAuthCall) {
+      original._retried = true;
+      try {
+        await refreshSession();
+        return api(original);
+      } catch (refreshError) {
+        // Fall through to signing out.
+      }
+    }
+    if (error.response?.status === 401 && !isAuthCall) {
+      clearSession();
       window.location.href = '/';
     }
     return Promise.reject(error);
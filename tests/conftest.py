@@ -0,0 +1,32 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# server.py reads its configuration at import time.
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "apartment_test")
+
+
+@pytest.fixture
+def app_db():
+    """``server`` bound to an empty in-memory database, with the payment gateways stubbed out."""
+    pytest.importorskip("mongomock_motor")
+    sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+    import suite
+
+    suite.install_gateway_stubs()
+    db = suite.connect(None)
+
+    async def clear():
+        # In-memory clients share one store, so start every test from nothing.
+        for name in await db.list_collection_names():
+            await db.drop_collection(name)
+
+    asyncio.run(clear())
+    return suite.server, db
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from audit import AuditLog
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+ACTOR = {"society_id": "default", "user_id": "u1", "email": "admin@example.com"}
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+def test_stop_returns_and_writes_event_recorded_in_flush_window():
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["audit_test"]["audit_log"]
+        audit_log = AuditLog(collection, flush_interval=30)
+        await audit_log.start()
+        await audit_log.record(ACTOR, "flat.create", "flat", "f1")
+        # Let the writer take the event and start waiting for the rest of its batch.
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(audit_log.stop(), 2)
+        return await collection.find({}, {"_id": 0}).to_list(None), audit_log.stats()
+
+    events, stats = run(scenario())
+    assert [(e["action"], e["target_id"]) for e in events] == [("flat.create", "f1")]
+    assert stats["written"] == 1 and stats["queued"] == 0
+
+
+def test_stop_writes_events_still_queued():
+    async def scenario():
+        collection = mongomock_motor.AsyncMongoMockClient()["audit_test"]["audit_log"]
+        audit_log = AuditLog(collection, batch_size=2, flush_interval=30)
+        await audit_log.start()
+        for n in range(5):
+            await audit_log.record(ACTOR, "payment.create", "payment", f"p{n}")
+        await asyncio.wait_for(audit_log.stop(), 2)
+        return sorted(e["target_id"] for e in await collection.find({}).to_list(None))
+
+    assert run(scenario()) == [f"p{n}" for n in range(5)]
@@ -0,0 +1,72 @@
+import asyncio
+
+from archive import PaymentArchive
+
+ADMIN = {"society_id": "s1", "user_id": "u1", "email": "admin@example.com", "role": "admin"}
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+async def add_flat(server, db):
+    await server.ensure_society(db, ADMIN["society_id"])
+    flat = server.Flat(society_id=ADMIN["society_id"], flat_number="A-101", owner_name="Owner",
+                       owner_email="owner@example.com", owner_phone="+910000000000", flat_size="2BHK")
+    await db.flats.insert_one(flat.model_dump())
+    return flat
+
+
+def payment(server, flat, month, year):
+    return server.PaymentCreate(flat_id=flat.id, month=month, year=year, amount=2500.0, payment_method="cash")
+
+
+def test_second_bulk_payment_for_the_same_month_is_rejected(app_db):
+    server, db = app_db
+
+    async def scenario():
+        flat = await add_flat(server, db)
+        first = await server.create_payments_bulk([payment(server, flat, 3, 2025)], current_user=ADMIN)
+        second = await server.create_payments_bulk(
+            [payment(server, flat, 3, 2025), payment(server, flat, 4, 2025)], current_user=ADMIN
+        )
+        return first, second, await db.payments.count_documents({"flat_id": flat.id, "month": 3, "year": 2025})
+
+    first, second, recorded = run(scenario())
+    assert first["created"] == 1
+    assert [r["status"] for r in second["results"]] == ["error", "created"]
+    assert second["results"][0]["detail"] == "Payment already recorded for this month"
+    assert recorded == 1
+
+
+def test_same_month_twice_in_one_request_is_rejected(app_db):
+    server, db = app_db
+
+    async def scenario():
+        flat = await add_flat(server, db)
+        return await server.create_payments_bulk(
+            [payment(server, flat, 3, 2025), payment(server, flat, 3, 2025)], current_user=ADMIN
+        )
+
+    result = run(scenario())
+    assert (result["created"], result["failed"]) == (1, 1)
+    assert result["results"][1]["detail"] == "Payment already recorded for this month"
+
+
+def test_archived_payment_still_rejects_a_second_bulk_payment(app_db):
+    server, db = app_db
+
+    async def scenario():
+        flat = await add_flat(server, db)
+        await server.create_payments_bulk([payment(server, flat, 1, 2020)], current_user=ADMIN)
+        # This worker has cached an older boundary when another one archives 2020.
+        await server.payment_archive.archive_before((2019, 1))
+        assert await server.payment_archive.boundary() == (2019, 1)
+        assert await PaymentArchive(db).archive_before((2021, 1)) == 1
+        result = await server.create_payments_bulk([payment(server, flat, 1, 2020)], current_user=ADMIN)
+        return result, await db.payments.count_documents({}), await db.payments_archive.count_documents({})
+
+    result, hot, cold = run(scenario())
+    assert result["created"] == 0
+    assert result["results"][0]["detail"] == "Payment already recorded for this month"
+    assert (hot, cold) == (0, 1)
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timezone
+
+from dues import amount_due, settle_dues
+from scheduler import Scheduler
+
+ADMIN = {"society_id": "s1", "user_id": "u1", "email": "admin@example.com", "role": "admin"}
+CHARGE = {"month": 3, "year": 2025, "base_charge": 2500.0}
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+def test_amount_due_prices_dues_with_their_late_fee():
+    flat = {"id": "f1", "custom_charge": None}
+    custom = {"id": "f2", "custom_charge": 3000.0}
+    assert amount_due(flat, CHARGE) == 2500.0
+    assert amount_due(custom, CHARGE) == 3000.0
+    # Dues keep the amount they were created with, even after the charge changes.
+    assert amount_due(flat, {**CHARGE, "base_charge": 2800.0}, {"amount": 2500.0, "late_fee": 0.0}) == 2500.0
+    assert amount_due(flat, CHARGE, {"amount": 2500.0, "late_fee": 100.0}) == 2600.0
+
+
+async def seed(server, db):
+    await server.ensure_society(db, ADMIN["society_id"])
+    flats = [
+        server.Flat(society_id=ADMIN["society_id"], flat_number=f"A-{n:03d}", owner_name=f"Owner {n}",
+                    owner_email=f"owner{n}@example.com", owner_phone="+910000000000", flat_size="2BHK",
+                    custom_charge=3000.0 if n == 2 else None).model_dump()
+        for n in range(3)
+    ]
+    await db.flats.insert_many(flats)
+    await db.monthly_charges.insert_one(server.MonthlyCharge(
+        society_id=ADMIN["society_id"], breakdown={"maintenance": 2500.0}, **CHARGE
+    ).model_dump())
+    return [flat["id"] for flat in flats]
+
+
+async def dues_by_flat(db, month, year):
+    return {
+        d["flat_id"]: (d["status"], d["amount"], d["late_fee"])
+        for d in await db.dues.find({"month": month, "year": year}, {"_id": 0}).to_list(None)
+    }
+
+
+def pay(server, flat_id, month, year, amount):
+    return server.PaymentCreate(flat_id=flat_id, month=month, year=year, amount=amount, payment_method="cash")
+
+
+def test_settle_dues_marks_only_the_given_dues_paid(app_db):
+    server, db = app_db
+
+    async def scenario():
+        flat_ids = await seed(server, db)
+        await Scheduler(db).run_due_jobs(datetime(2025, 3, 1, tzinfo=timezone.utc))
+        await settle_dues(db, ADMIN["society_id"], [(flat_ids[0], 3, 2025), (flat_ids[0], 3, 2025)])
+        return flat_ids, await dues_by_flat(db, 3, 2025)
+
+    flat_ids, dues = run(scenario())
+    assert [dues[f][0] for f in flat_ids] == ["paid", "pending", "pending"]
+
+
+def test_late_fee_applies_to_unpaid_dues_once(app_db):
+    server, db = app_db
+    scheduler = Scheduler(db, late_fee_day=15, late_fee=100.0)
+
+    async def scenario():
+        on_time, written_directly, late = await seed(server, db)
+        await scheduler.run_due_jobs(datetime(2025, 3, 1, tzinfo=timezone.utc))
+        await server.create_payments_bulk([pay(server, on_time, 3, 2025, 2500.0)], current_user=ADMIN)
+        # A payment that skipped settle_dues is still found before fees are charged.
+        await db.payments.insert_one(server.Payment(
+            society_id=ADMIN["society_id"], flat_id=written_directly, flat_number="A-001", month=3, year=2025,
+            amount=2500.0, payment_date="2025-03-10T00:00:00+00:00", payment_method="cash",
+            receipt_number="REC-IMPORT-1", status="paid"
+        ).model_dump())
+        before = await server.price_dues(ADMIN, [server.DueItem(flat_id=late, month=3, year=2025)])
+        await scheduler.run_due_jobs(datetime(2025, 3, 16, tzinfo=timezone.utc))
+        # A second worker, or a retried tick, charges nothing more.
+        await db.job_runs.delete_many({"_id": {"$regex": "^late-fees-"}})
+        await scheduler.run_due_jobs(datetime(2025, 3, 17, tzinfo=timezone.utc))
+        after = await server.price_dues(ADMIN, [server.DueItem(flat_id=late, month=3, year=2025)])
+        return (on_time, written_directly, late), await dues_by_flat(db, 3, 2025), before, after
+
+    (on_time, written_directly, late), dues, before, after = run(scenario())
+    assert dues[on_time] == ("paid", 2500.0, 0.0)
+    assert dues[written_directly] == ("paid", 2500.0, 0.0)
+    assert dues[late] == ("pending", 3000.0, 100.0)
+    assert before[0]["amount"] == 3000.0
+    assert after[0]["amount"] == 3100.0
+
+
+def test_unpaid_dues_carry_over_into_the_next_month(app_db):
+    server, db = app_db
+    scheduler = Scheduler(db, late_fee_day=15, late_fee=100.0)
+
+    async def scenario():
+        paid, unpaid, _ = await seed(server, db)
+        await scheduler.run_due_jobs(datetime(2025, 3, 1, tzinfo=timezone.utc))
+        await server.create_payments_bulk([pay(server, paid, 3, 2025, 2500.0)], current_user=ADMIN)
+        await scheduler.run_due_jobs(datetime(2025, 3, 16, tzinfo=timezone.utc))
+        await scheduler.run_due_jobs(datetime(2025, 4, 1, tzinfo=timezone.utc))
+        owed = await server.price_dues(ADMIN, [server.DueItem(flat_id=unpaid, month=m, year=2025) for m in (3, 4)])
+        await server.create_payments_bulk([pay(server, unpaid, 3, 2025, owed[0]["amount"])], current_user=ADMIN)
+        return (paid, unpaid), await dues_by_flat(db, 3, 2025), await dues_by_flat(db, 4, 2025), owed
+
+    (paid, unpaid), march, april, owed = run(scenario())
+    assert march[paid] == ("paid", 2500.0, 0.0)
+    assert march[unpaid] == ("paid", 2500.0, 100.0)
+    # April's charge was rolled over from March and its dues start without a fee.
+    assert april[paid] == ("pending", 2500.0, 0.0)
+    assert april[unpaid] == ("pending", 2500.0, 0.0)
+    assert [o["amount"] for o in owed] == [2600.0, 2500.0]
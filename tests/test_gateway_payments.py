@@ -0,0 +1,104 @@
+import asyncio
+import re
+
+import pytest
+from fastapi import HTTPException
+
+ADMIN = {"society_id": "s1", "user_id": "u1", "email": "admin@example.com", "role": "admin"}
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+async def seed(server, db, flats=2, months=((3, 2025), (4, 2025))):
+    await server.ensure_society(db, ADMIN["society_id"])
+    flat_docs = [
+        server.Flat(society_id=ADMIN["society_id"], flat_number=f"A-{n:03d}", owner_name=f"Owner {n}",
+                    owner_email=f"owner{n}@example.com", owner_phone="+910000000000", flat_size="2BHK").model_dump()
+        for n in range(flats)
+    ]
+    await db.flats.insert_many(flat_docs)
+    await db.monthly_charges.insert_many([
+        server.MonthlyCharge(society_id=ADMIN["society_id"], month=month, year=year, base_charge=2500.0,
+                             breakdown={"maintenance": 2500.0}).model_dump()
+        for month, year in months
+    ])
+    return [
+        server.DueItem(flat_id=flat["id"], month=month, year=year) for flat in flat_docs for month, year in months
+    ]
+
+
+async def checkout(server, items):
+    request = server.MultiCheckoutRequest(items=items, origin_url="https://app.example.com")
+    return await server.create_multi_checkout_session(request, current_user=ADMIN)
+
+
+def test_paid_checkout_records_one_receipt_per_due(app_db):
+    server, db = app_db
+
+    async def scenario():
+        items = await seed(server, db)
+        session = await checkout(server, items)
+        await server.get_checkout_status(session["session_id"], current_user=ADMIN)
+        return items, await db.payments.find({}, {"_id": 0}).to_list(None)
+
+    items, payments = run(scenario())
+    assert sorted((p["flat_id"], p["month"], p["year"]) for p in payments) == sorted(
+        (i.flat_id, i.month, i.year) for i in items
+    )
+    assert all(p["payment_method"] == "stripe" and p["amount"] == 2500.0 for p in payments)
+    receipts = sorted(p["receipt_number"] for p in payments)
+    assert all(re.fullmatch(r"REC-\d{8}-\d{6}", r) for r in receipts)
+    assert [int(r[-6:]) for r in receipts] == [1, 2, 3, 4]
+
+
+def test_receipt_numbers_continue_across_checkouts(app_db):
+    server, db = app_db
+
+    async def scenario():
+        items = await seed(server, db)
+        for part in (items[:1], items[1:]):
+            session = await checkout(server, part)
+            await server.get_checkout_status(session["session_id"], current_user=ADMIN)
+        return sorted(p["receipt_number"] for p in await db.payments.find({}, {"_id": 0}).to_list(None))
+
+    assert [int(r[-6:]) for r in run(scenario())] == [1, 2, 3, 4]
+
+
+def test_replayed_confirmation_does_not_record_twice(app_db):
+    server, db = app_db
+
+    async def scenario():
+        items = await seed(server, db)
+        session = await checkout(server, items)
+        # The success page and a retried poll confirm the same session at once, then again.
+        await asyncio.gather(*[
+            server.get_checkout_status(session["session_id"], current_user=ADMIN) for _ in range(3)
+        ])
+        await server.get_checkout_status(session["session_id"], current_user=ADMIN)
+        transaction = await db.payment_transactions.find_one({"session_id": session["session_id"]}, {"_id": 0})
+        # Recording the paid transaction again finds every due already paid.
+        recorded_again = await server.record_gateway_payments(ADMIN, transaction, "stripe")
+        return items, recorded_again, await db.payments.count_documents({})
+
+    items, recorded_again, payments = run(scenario())
+    assert recorded_again == 0
+    assert payments == len(items)
+
+
+def test_checkout_rejects_dues_already_paid(app_db):
+    server, db = app_db
+
+    async def scenario():
+        items = await seed(server, db)
+        session = await checkout(server, items[:1])
+        await server.get_checkout_status(session["session_id"], current_user=ADMIN)
+        with pytest.raises(HTTPException) as rejected:
+            await server.price_dues(ADMIN, items)
+        return rejected.value, await server.price_dues(ADMIN, items[1:])
+
+    rejected, priced = run(scenario())
+    assert rejected.status_code == 400
+    assert "has already paid for 3/2025" in rejected.detail
+    assert [p["amount"] for p in priced] == [2500.0, 2500.0, 2500.0]
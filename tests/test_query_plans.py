@@ -0,0 +1,49 @@
+"""The list endpoints' query shapes are served by indexes (needs a real mongod)."""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "benchmarks"))
+import query_plans  # noqa: E402
+
+pymongo = pytest.importorskip("pymongo")
+motor_asyncio = pytest.importorskip("motor.motor_asyncio")
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("PLAN_DB_NAME", "apartment_query_plans_test")
+
+
+@pytest.fixture(scope="module")
+def plan_db():
+    client = pymongo.MongoClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError as e:
+        client.close()
+        pytest.skip(f"no mongod at {MONGO_URL}: {e}")
+    client.drop_database(DB_NAME)
+
+    async def prepare():
+        motor_client = motor_asyncio.AsyncIOMotorClient(MONGO_URL)
+        try:
+            await query_plans.prepare(motor_client[DB_NAME])
+        finally:
+            motor_client.close()
+
+    asyncio.run(prepare())
+    yield client[DB_NAME]
+    client.drop_database(DB_NAME)
+    client.close()
+
+
+@pytest.mark.parametrize("label, collection, query, sort", query_plans.CASES, ids=[c[0] for c in query_plans.CASES])
+def test_query_uses_an_index(plan_db, label, collection, query, sort):
+    assert query["society_id"] == query_plans.SOCIETY
+    explained = plan_db.command("explain", {"find": collection, "filter": query, "sort": sort},
+                                verbosity="queryPlanner")
+    stages = query_plans.plan_stages(explained)
+    assert "COLLSCAN" not in stages, f"{label}: {' <- '.join(stages)}"
+    assert "IXSCAN" in stages
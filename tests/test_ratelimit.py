@@ -0,0 +1,32 @@
+import asyncio
+
+from ratelimit import Limit, MemoryBuckets
+
+
+def test_new_keys_evict_least_recent_buckets_only():
+    async def scenario():
+        buckets = MemoryBuckets(max_keys=100)
+        email = Limit("2/300")
+        for _ in range(2):
+            assert (await buckets.take("login-email:victim@example.com", email))[0]
+        # A flood of fresh keys fills the map; the victim's bucket is kept drawn on.
+        for n in range(1000):
+            await buckets.take(f"login-ip:203.0.{n // 250}.{n % 250}", Limit("20/60"))
+            if n % 50 == 0:
+                allowed, retry_after = await buckets.take("login-email:victim@example.com", email)
+                assert not allowed and retry_after > 0
+        assert len(buckets._buckets) <= 100
+
+    asyncio.run(scenario())
+
+
+def test_refilled_buckets_are_evicted_by_their_own_period():
+    async def scenario():
+        buckets = MemoryBuckets(max_keys=10)
+        await buckets.take("short", Limit("1/0.01"))
+        await buckets.take("long", Limit("1/300"))
+        await asyncio.sleep(0.02)
+        await buckets.take("new", Limit("1/300"))
+        assert list(buckets._buckets) == ["long", "new"]
+
+    asyncio.run(scenario())